@@ -0,0 +1,55 @@
+"""
+Synthesized inputs for the benchmarks, so they run without network access or sample files.
+"""
+import io
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from PIL import Image
+
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz, no padding, joint stereo
+MP3_FRAME_HEADER = bytes([0xFF, 0xFB, 0x90, 0x44])
+MP3_FRAME_SIZE = 144 * 128000 // 44100
+
+
+def make_mp3(path: str, size: int) -> None:
+    """
+    Write an MP3 file of silent frames of about the given size in bytes.
+    """
+    frame = MP3_FRAME_HEADER + bytes(MP3_FRAME_SIZE - len(MP3_FRAME_HEADER))
+    with open(path, 'wb') as f:
+        f.write(frame * max(1, size // MP3_FRAME_SIZE))
+
+
+def make_jpeg(width: int = 1280, height: int = 720) -> bytes:
+    """
+    Encode a gradient image the size of a YouTube thumbnail as a JPEG.
+    """
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+class ThumbnailServer:
+    """
+    Local HTTP stand-in for the thumbnail host, serving the same JPEG on every path.
+    """
+
+    def __init__(self):
+        self.image = make_jpeg()
+        app = web.Application()
+        app.router.add_get('/{name}', self._handle)
+        self._server = TestServer(app, host='127.0.0.1')
+
+    async def start(self) -> None:
+        await self._server.start_server()
+
+    async def close(self) -> None:
+        await self._server.close()
+
+    def url(self, name: str) -> str:
+        return str(self._server.make_url(f'/{name}'))
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.image, content_type='image/jpeg')
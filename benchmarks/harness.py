@@ -0,0 +1,181 @@
+"""
+Measurement, reporting and baseline comparison shared by the benchmarks.
+"""
+import inspect
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+# Working directory the benchmarks were started from, paths given on the command line are relative to it
+INITIAL_CWD = os.getcwd()
+
+
+def setup_environment() -> str:
+    """
+    Make the application importable without Telegram credentials, and keep everything it
+    writes (tmp/, cache/, logs/) in a scratch directory.
+
+    Must be called before the application modules are imported.
+
+    :return: The scratch directory, which is also the new working directory.
+    """
+    workdir = tempfile.mkdtemp(prefix='musicbot-bench-')
+
+    sys.path.insert(0, SRC_DIR)
+    for name, value in {
+        'API_ID': '0',
+        'CHANNEL_ID': '0',
+        'MONGO_URI': 'mongodb://localhost:27017',
+        'MONGO_DB': 'benchmark',
+        'CACHE_DIR': os.path.join(workdir, 'cache'),
+    }.items():
+        os.environ.setdefault(name, value)
+
+    os.chdir(workdir)
+    return workdir
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of the samples.
+    """
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def get_peak_rss_mb() -> float:
+    """
+    Peak resident set size of the process so far.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def get_bytes_written() -> int | None:
+    """
+    Bytes written by the process and its waited-for subprocesses so far, whether to disk or not,
+    None where it is not reported.
+    """
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('wchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+async def measure(
+        name: str,
+        func: Callable[[], Any | Awaitable],
+        iterations: int,
+        warmup: int = 1,
+        ops_per_iteration: int = 1,
+        bytes_per_iteration: int | None = None,
+        setup: Callable[[], None] | None = None,
+) -> dict:
+    """
+    Call `func` repeatedly and summarize the latency of each call.
+
+    :param name: Name of the benchmark in the report and the baseline.
+    :param func: Function or coroutine function to measure.
+    :param iterations: Number of measured calls.
+    :param warmup: Number of calls made before measuring.
+    :param ops_per_iteration: Number of operations done by one call, for the throughput.
+    :param bytes_per_iteration: Number of bytes processed by one call, for the throughput in MB/s.
+    :param setup: Called before each call, outside of the measurement.
+    """
+    async def call():
+        if setup:
+            setup()
+        result = func()
+        if inspect.isawaitable(result):
+            await result
+
+    for _ in range(warmup):
+        await call()
+
+    samples = []
+    written = 0
+    for _ in range(iterations):
+        if setup:
+            setup()
+        written_before = get_bytes_written()
+        call_started = time.perf_counter()
+        result = func()
+        if inspect.isawaitable(result):
+            await result
+        samples.append(time.perf_counter() - call_started)
+        if written_before is not None:
+            written += get_bytes_written() - written_before
+    elapsed = sum(samples)
+
+    result = {
+        'name': name,
+        'iterations': iterations,
+        'ops_per_sec': iterations * ops_per_iteration / elapsed,
+        'mean_ms': sum(samples) / len(samples) * 1000,
+        'p50_ms': percentile(samples, 0.50) * 1000,
+        'p95_ms': percentile(samples, 0.95) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'peak_rss_mb': get_peak_rss_mb(),
+    }
+    if bytes_per_iteration:
+        result['mb_per_sec'] = iterations * bytes_per_iteration / elapsed / (1024 * 1024)
+    if get_bytes_written() is not None:
+        result['written_mb_per_op'] = written / iterations / ops_per_iteration / (1024 * 1024)
+    return result
+
+
+def format_result(result: dict) -> str:
+    throughput = f"{result['ops_per_sec']:12.1f} ops/s"
+    if 'mb_per_sec' in result:
+        throughput += f" {result['mb_per_sec']:8.1f} MB/s"
+    else:
+        throughput += " " * 14
+
+    return (
+        f"{result['name']:<36} {throughput}"
+        f"  p50 {result['p50_ms']:9.3f} ms  p95 {result['p95_ms']:9.3f} ms  p99 {result['p99_ms']:9.3f} ms"
+        f"  rss {result['peak_rss_mb']:7.1f} MB"
+        + (f"  written {result['written_mb_per_op']:8.2f} MB/op" if 'written_mb_per_op' in result else "")
+    )
+
+
+def save_baseline(path: str, results: list[dict]) -> None:
+    with open(path, 'w') as f:
+        json.dump({'created_at': time.time(), 'results': results}, f, indent=2)
+
+
+def compare_baseline(path: str, results: list[dict], threshold: float) -> list[str]:
+    """
+    Compare the results with a saved baseline.
+
+    :param threshold: Relative slowdown of the median latency reported as a regression, e.g. 0.1 for 10%.
+    :return: The lines of the comparison report, regressions are marked.
+    """
+    with open(path) as f:
+        baseline = {result['name']: result for result in json.load(f)['results']}
+
+    lines = []
+    for result in results:
+        before = baseline.get(result['name'])
+        if before is None:
+            lines.append(f"{result['name']:<36} new")
+            continue
+
+        latency_change = result['p50_ms'] / before['p50_ms'] - 1
+        throughput_change = result['ops_per_sec'] / before['ops_per_sec'] - 1
+        marker = "  REGRESSION" if latency_change > threshold else ""
+        lines.append(
+            f"{result['name']:<36} p50 {latency_change:+8.1%}  throughput {throughput_change:+8.1%}{marker}"
+        )
+    return lines
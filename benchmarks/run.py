@@ -0,0 +1,347 @@
+"""
+Offline benchmarks of the download, tagging, thumbnail, ORM, model hydration and filename hot paths.
+
+Nothing is fetched from the network: the downloads are served by a fake download service
+from synthesized MP3 files, and the thumbnails by a local HTTP server. The ORM benchmarks run
+against the MongoDB given with --mongo-uri, or mongomock-motor if it is installed.
+
+Usage:
+    uv run benchmarks/run.py [--only download tag] [--save baseline.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+import shutil
+import sys
+import uuid
+
+from harness import INITIAL_CWD, setup_environment, measure, format_result, save_baseline, compare_baseline
+
+WORKDIR = setup_environment()
+
+from bson import ObjectId  # noqa: E402
+from mutagen.mp3 import MP3  # noqa: E402
+from pymongo import AsyncMongoClient  # noqa: E402
+
+import core.orm.descriptors  # noqa: E402
+from core.scratch import scratch  # noqa: E402
+from core.templates import AudioData, AudioMetadata  # noqa: E402
+from db.models import CachedMedia, User  # noqa: E402
+from fixtures import make_mp3, ThumbnailServer  # noqa: E402
+from services.download.base import BaseDownloadService  # noqa: E402
+from services.audio_cache import AudioCacheService  # noqa: E402
+from services.http import HTTPClient  # noqa: E402
+from services.metadata_cache import MetadataCacheService  # noqa: E402
+from utils.dlp_utils import valid_filename  # noqa: E402
+
+MB = 1024 * 1024
+
+# The application logs every step at DEBUG level
+logging.getLogger().setLevel(logging.WARNING)
+
+
+class FakeDownloadService(BaseDownloadService):
+    """
+    Download service serving a local fixture file instead of downloading from a source.
+    """
+    source_path: str = None
+    thumbnail_url: str = None
+
+    @classmethod
+    async def extract_info(cls, url: str) -> dict:
+        # No 'id', so nothing is written to the metadata cache
+        return {'title': f"Benchmark track {url}", 'uploader': "Benchmark artist"}
+
+    @classmethod
+    async def get_audio_details(cls, info: dict) -> AudioMetadata:
+        return AudioMetadata(artist=info['uploader'], title=info['title'], thumbnail_url=cls.thumbnail_url)
+
+    @classmethod
+    async def download_audio(cls, info: dict, save_path: str) -> str:
+        file_path = f'{save_path}.mp3'
+        await asyncio.to_thread(shutil.copyfile, cls.source_path, file_path)
+        return file_path
+
+    @classmethod
+    def _get_encode_command(cls, source_path: str, audio_data: AudioData) -> list[str]:
+        # Stands in for FFmpeg copying an MP3 stream, which reads and writes every byte
+        return ['dd', f'if={source_path}', 'bs=1M', 'status=none']
+
+
+async def bench_download(server: ThumbnailServer, iterations: int) -> list[dict]:
+    size = 5 * MB
+    FakeDownloadService.source_path = os.path.join(WORKDIR, 'source.mp3')
+    FakeDownloadService.thumbnail_url = server.url('download.jpg')
+    make_mp3(FakeDownloadService.source_path, size)
+
+    async def download():
+        async with scratch.job() as directory:
+            await FakeDownloadService.download(url=uuid.uuid4().hex, directory=directory)
+
+    # A video whose finished file and metadata are cached, so neither the source nor FFmpeg is involved
+    video_id = 'benchmark01'
+    MetadataCacheService.memory.set(video_id, await FakeDownloadService.get_audio_details(
+        await FakeDownloadService.extract_info(video_id)
+    ))
+    await AudioCacheService.store(video_id=video_id, file_path=FakeDownloadService.source_path)
+
+    async def download_cached():
+        async with scratch.job() as directory:
+            await FakeDownloadService.download(url=f'https://www.youtube.com/watch?v={video_id}', directory=directory)
+
+    return [
+        await measure('download (5 MB, cached thumbnail)', download, iterations, bytes_per_iteration=size),
+        await measure('download (5 MB, cached audio)', download_cached, iterations, bytes_per_iteration=size),
+    ]
+
+
+def tag_in_place(audio_data: AudioData) -> None:
+    """
+    Write the tags into an existing MP3 file, as the second pass of the two-pass tagging did.
+    Kept here as the reference the single-pass encoding is compared with.
+    """
+    audio_file = MP3(audio_data.file_path)
+    if audio_file.tags is None:
+        audio_file.add_tags()
+    for frame in BaseDownloadService._get_id3_frames(audio_data):  # noqa
+        audio_file.tags.add(frame)
+    audio_file.save()
+
+
+async def bench_tag(iterations: int) -> list[dict]:
+    results = []
+    thumbnail_path = os.path.join(WORKDIR, 'cover.jpg')
+    with open(thumbnail_path, 'wb') as f:
+        f.write(ThumbnailServer().image)
+
+    for size_mb in (1, 10, 50):
+        source_path = os.path.join(WORKDIR, f'untagged_{size_mb}.mp3')
+        file_path = os.path.join(WORKDIR, f'tag_{size_mb}.mp3')
+        make_mp3(source_path, size_mb * MB)
+        audio_data = AudioData(
+            file_path=file_path,
+            thumbnail_path=thumbnail_path,
+            artist="Benchmark artist",
+            title="Benchmark track",
+            thumbnail_url="",
+        )
+
+        results.append(await measure(
+            f'tag in place ({size_mb} MB)',
+            lambda: asyncio.to_thread(tag_in_place, audio_data),
+            iterations,
+            bytes_per_iteration=size_mb * MB,
+            # Every call tags an untagged file, like a fresh download
+            setup=lambda: shutil.copyfile(source_path, file_path),
+        ))
+        if size_mb > 1:
+            results += await bench_encode(source_path, audio_data, iterations)
+
+        os.remove(source_path)
+        os.remove(file_path)
+
+    return results
+
+
+async def bench_encode(source_path: str, audio_data: AudioData, iterations: int) -> list[dict]:
+    """
+    Compare writing the tags after the encoder with writing them in the same pass.
+    The encoder is stood in for by dd, so only the tagging differs.
+    """
+    size = os.path.getsize(source_path)
+    size_mb = size // MB
+
+    async def two_pass():
+        with open(audio_data.file_path, 'wb') as output:
+            process = await asyncio.create_subprocess_exec(
+                *FakeDownloadService._get_encode_command(source_path, audio_data), stdout=output,
+            )
+            await process.wait()
+        await asyncio.to_thread(tag_in_place, audio_data)
+
+    async def single_pass():
+        await FakeDownloadService.encode_audio(source_path=source_path, audio_data=audio_data)
+
+    return [
+        await measure(f'encode + tag ({size_mb} MB, two-pass)', two_pass, iterations, bytes_per_iteration=size),
+        await measure(f'encode + tag ({size_mb} MB, single-pass)', single_pass, iterations, bytes_per_iteration=size),
+    ]
+
+
+async def bench_thumbnail(server: ThumbnailServer, iterations: int) -> list[dict]:
+    save_path = os.path.join(WORKDIR, 'thumbnail.jpg')
+
+    async def cold():
+        # A new URL misses the cache, so the image is fetched and normalized
+        await BaseDownloadService.download_thumbnail(server.url(f'{uuid.uuid4().hex}.jpg'), save_path)
+        os.remove(save_path)
+
+    async def warm():
+        await BaseDownloadService.download_thumbnail(server.url('warm.jpg'), save_path)
+        os.remove(save_path)
+
+    return [
+        await measure('download_thumbnail (cold)', cold, iterations),
+        await measure('download_thumbnail (cached)', warm, iterations),
+    ]
+
+
+async def bench_orm(mongo_uri: str | None, iterations: int) -> list[dict]:
+    if mongo_uri:
+        client = AsyncMongoClient(mongo_uri)
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            print("Skipping the ORM benchmarks: pass --mongo-uri or install mongomock-motor.")
+            return []
+        client = AsyncMongoMockClient()
+
+    database_name = f'musicbot_bench_{uuid.uuid4().hex[:8]}'
+    core.orm.descriptors.db = client[database_name]
+
+    await CachedMedia.bulk_create([
+        {
+            'video_id': f'video{i}', 'audio_format': 'mp3', 'bitrate': 192, 'channel_id': i % 10,
+            'title': f"Track {i}", 'artist': "Artist", 'message_id': i,
+        }
+        for i in range(1000)
+    ])
+
+    counter = iter(range(10 ** 9))
+
+    async def get_or_create_existing():
+        await CachedMedia.get_or_create(
+            video_id=f'video{next(counter) % 1000}', audio_format='mp3', bitrate=192,
+            defaults={'channel_id': 0, 'title': "Track", 'artist': "Artist"},
+        )
+
+    async def get_or_create_new():
+        await CachedMedia.get_or_create(
+            video_id=f'new{next(counter)}', audio_format='mp3', bitrate=192,
+            defaults={'channel_id': 0, 'title': "Track", 'artist': "Artist"},
+        )
+
+    async def filter_channel():
+        await CachedMedia.filter({'channel_id': 3})
+
+    results = [
+        await measure('orm get_or_create (existing)', get_or_create_existing, iterations),
+        await measure('orm get_or_create (new)', get_or_create_new, iterations),
+        await measure('orm filter (100 documents)', filter_channel, iterations, ops_per_iteration=100),
+    ]
+
+    if mongo_uri:
+        await client.drop_database(database_name)
+        await client.close()
+    return results
+
+
+async def bench_hydration(iterations: int) -> list[dict]:
+    """
+    Per-document cost of building models from documents shaped like the ones in the `users` collection.
+
+    Assigning the values to the fields without validation, as a trusted read would, is measured
+    next to `model_validate` and `model_construct` to show it does not pay off.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    documents = [
+        {
+            '_id': ObjectId(), 'user_id': 100_000 + i, 'first_name': f"User {i}", 'last_name': None,
+            'username': f"user_{i}", 'is_active': True, 'created_at': now, 'updated_at': now, 'deleted_at': None,
+        }
+        for i in range(1000)
+    ]
+    keys = [(name, field.alias or name) for name, field in User.model_fields.items()]
+
+    def trusted_read(document: dict) -> User:
+        obj = User.__new__(User)
+        object.__setattr__(obj, '__dict__', {name: document[key] for name, key in keys})
+        object.__setattr__(obj, '__pydantic_fields_set__', {name for name, _ in keys})
+        object.__setattr__(obj, '__pydantic_extra__', None)
+        object.__setattr__(obj, '__pydantic_private__', None)
+        return obj
+
+    def run(build):
+        def build_all():
+            for document in documents:
+                build(document)
+        return build_all
+
+    count = len(documents)
+    return [
+        await measure('hydrate model_validate (1000 docs)', run(User.model_validate), iterations, ops_per_iteration=count),
+        await measure('hydrate trusted read (1000 docs)', run(trusted_read), iterations, ops_per_iteration=count),
+        await measure(
+            'hydrate model_construct (1000 docs)',
+            run(lambda document: User.model_construct(**document)), iterations, ops_per_iteration=count,
+        ),
+    ]
+
+
+async def bench_valid_filename(iterations: int) -> list[dict]:
+    titles = [
+        f"Artist {i} - Track: \"Live\" at <Venue> / Remastered {i}? *Official* | Video..." for i in range(1000)
+    ]
+
+    def run():
+        for title in titles:
+            valid_filename(title)
+
+    return [await measure('valid_filename (1000 titles)', run, iterations, ops_per_iteration=len(titles))]
+
+
+BENCHMARKS = ('download', 'tag', 'thumbnail', 'orm', 'hydration', 'valid_filename')
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--mongo-uri', help="MongoDB for the ORM benchmarks, a temporary database is used")
+    parser.add_argument('--save', metavar='PATH', help="Save the results as a baseline")
+    parser.add_argument('--compare', metavar='PATH', help="Compare the results with a saved baseline")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Median slowdown reported as a regression")
+    args = parser.parse_args()
+
+    server = ThumbnailServer()
+    await server.start()
+
+    results = []
+    try:
+        if 'download' in args.only:
+            results += await bench_download(server, args.iterations)
+        if 'tag' in args.only:
+            results += await bench_tag(args.iterations)
+        if 'thumbnail' in args.only:
+            results += await bench_thumbnail(server, args.iterations)
+        if 'orm' in args.only:
+            results += await bench_orm(args.mongo_uri, args.iterations * 10)
+        if 'hydration' in args.only:
+            results += await bench_hydration(args.iterations)
+        if 'valid_filename' in args.only:
+            results += await bench_valid_filename(args.iterations)
+    finally:
+        await server.close()
+        await HTTPClient.close()
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+    for result in results:
+        print(format_result(result))
+
+    if args.compare:
+        print(f"\nCompared with {args.compare}:")
+        lines = compare_baseline(os.path.join(INITIAL_CWD, args.compare), results, args.threshold)
+        print('\n'.join(lines))
+        if any(line.endswith('REGRESSION') for line in lines):
+            sys.exit(1)
+
+    if args.save:
+        save_baseline(os.path.join(INITIAL_CWD, args.save), results)
+        print(f"\nBaseline saved to {args.save}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
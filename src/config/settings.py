@@ -1,5 +1,6 @@
 from dotenv import load_dotenv
 import os
+import socket
 
 # Load environment variables from a .env file
 load_dotenv()
@@ -9,12 +10,106 @@ BOT_TOKEN = os.getenv("BOT_API_TOKEN")
 API_ID = int(os.getenv("API_ID"))
 API_HASH = os.getenv("API_HASH")
 PHONE_NUMBER = os.getenv("PHONE_NUMBER")
+# Session file of the user account, without the .session extension. Processes must not share one
+TELETHON_SESSION = os.getenv("TELETHON_SESSION", "session_name")
 CHANNEL_URL = os.getenv("CHANNEL_URL")
 CHANNEL_ID = int(os.getenv("CHANNEL_ID"))
 
+# Bot API server
+# Base URL of a self-hosted telegram-bot-api server, e.g. http://telegram-bot-api:8081, api.telegram.org by default
+BOT_API_URL = os.getenv("BOT_API_URL")
+# The server runs with --local: files up to 2000 MB are passed to it by path instead of being uploaded
+BOT_API_LOCAL = os.getenv("BOT_API_LOCAL", "false").lower() == "true"
+# SCRATCH_DIR as mounted in the server, if it differs
+BOT_API_SCRATCH_DIR = os.getenv("BOT_API_SCRATCH_DIR")
+
+# Updates
+# "polling" pulls updates with getUpdates, "webhook" receives them on the web server
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Public URL Telegram posts updates to, e.g. https://music.example.com/webhook
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Sent by Telegram in X-Telegram-Bot-Api-Secret-Token, shared by all replicas
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+# Connections Telegram opens to deliver updates, and updates handled at once per process
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", "100"))
+
+# Web server, listened on by nginx's music_bot upstream
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("WEB_PORT", "8000"))
+
+# Metrics
+# Serve Prometheus metrics of the process on METRICS_PATH of the web server
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
+
 # MongoDB
 MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB = os.getenv("MONGO_DB")
+# Explain ORM queries and log collection scans and queries slower than ORM_SLOW_QUERY_MS
+ORM_PROFILE = os.getenv("ORM_PROFILE", "false").lower() == "true"
+ORM_SLOW_QUERY_MS = float(os.getenv("ORM_SLOW_QUERY_MS", "100"))
+
+# Audio
+# "transcode" re-encodes to AUDIO_CODEC, "native" keeps the source stream and remuxes it into m4a
+AUDIO_MODE = os.getenv("AUDIO_MODE", "transcode")
+AUDIO_CODEC = os.getenv("AUDIO_CODEC", "mp3")
+AUDIO_BITRATE = int(os.getenv("AUDIO_BITRATE", "192"))
+
+# Processes
+# "all" runs the bot and a worker in one process, "dispatcher" only takes requests
+# and queues them in MongoDB, "worker" only runs the queued jobs
+RUN_MODE = os.getenv("RUN_MODE", "all")
+WORKER_ID = os.getenv("WORKER_ID", f"{socket.gethostname()}-{os.getpid()}")
+# Seconds between two checks of the job queue when it is empty or the worker is busy
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "1"))
+# A running job is renewed every third of the lease, and taken over by another worker once
+# its lease expires, up to JOB_MAX_ATTEMPTS times
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# Scheduler
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "4"))
+MAX_JOBS_PER_USER = int(os.getenv("MAX_JOBS_PER_USER", "2"))
+MAX_QUEUE_SIZE = int(os.getenv("MAX_QUEUE_SIZE", "100"))
+EXTRACT_CONCURRENCY = int(os.getenv("EXTRACT_CONCURRENCY", "4"))
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "4"))
+TRANSCODE_CONCURRENCY = int(os.getenv("TRANSCODE_CONCURRENCY", str(os.cpu_count() or 2)))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "2"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "3"))
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "200"))
+
+# MTProto uploads
+UPLOAD_CONNECTIONS = int(os.getenv("UPLOAD_CONNECTIONS", "4"))
+UPLOAD_PART_SIZE = int(os.getenv("UPLOAD_PART_SIZE_KB", "512")) * 1024
+UPLOAD_PART_RETRIES = int(os.getenv("UPLOAD_PART_RETRIES", "3"))
+# Pipe FFmpeg output straight into the MTProto upload instead of writing the file to tmp/
+STREAMING_UPLOADS = os.getenv("STREAMING_UPLOADS", "false").lower() == "true"
+
+# Scratch space
+# Working files of the jobs, one directory per job. Point it at a tmpfs mount to keep them in memory
+SCRATCH_DIR = os.getenv("SCRATCH_DIR", os.getcwd() + "/tmp")
+# Every job reserves twice the estimated size of its download of the quota, at least SCRATCH_JOB_RESERVE_MB,
+# no more jobs are started while it or the measured usage is used up. 0 disables the quota
+SCRATCH_QUOTA_MB = int(os.getenv("SCRATCH_QUOTA_MB", "4096"))
+SCRATCH_JOB_RESERVE_MB = int(os.getenv("SCRATCH_JOB_RESERVE_MB", "256"))
+# Files of jobs that are not running anymore are removed after this long, it must exceed the longest job
+SCRATCH_MAX_AGE_SECONDS = int(os.getenv("SCRATCH_MAX_AGE_SECONDS", str(6 * 3600)))
+
+# HTTP
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_TIMEOUT = int(os.getenv("HTTP_TIMEOUT", "30"))
+
+# Caches
+CACHE_DIR = os.getenv("CACHE_DIR", os.getcwd() + "/cache")
+THUMBNAIL_CACHE_SIZE_MB = int(os.getenv("THUMBNAIL_CACHE_SIZE_MB", "100"))
+# Finished audio files kept to skip the download and the encoding of repeat requests, 0 disables the cache
+AUDIO_CACHE_SIZE_MB = int(os.getenv("AUDIO_CACHE_SIZE_MB", "2048"))
+METADATA_CACHE_SIZE = int(os.getenv("METADATA_CACHE_SIZE", "1000"))
+METADATA_CACHE_TTL = int(os.getenv("METADATA_CACHE_TTL", str(7 * 24 * 3600)))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "600"))
 
 # Miscellaneous
 COOKIES_FILE = os.getenv("COOKIE_FILE")
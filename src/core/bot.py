@@ -1,11 +1,20 @@
+import asyncio
+import os
+from pathlib import Path
+
 from aiogram import Bot
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import SimpleFilesPathWrapper, TelegramAPIServer
 from aiogram.enums import ParseMode
 from aiogram.types.bot_command import BotCommand
 from aiogram import Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
 from handlers import register_all_handlers
 from config import settings
+from config.logging_conf import logger
+from core.web import app, init_web
 from utils.bot_utils import set_descripton, set_commands, set_short_description
 
 
@@ -13,8 +22,31 @@ from utils.bot_utils import set_descripton, set_commands, set_short_description
 dp = Dispatcher()
 register_all_handlers(dp)
 
+def get_session() -> AiohttpSession | None:
+    """
+    Get the session talking to the self-hosted Bot API server, if one is configured.
+    """
+    if not settings.BOT_API_URL:
+        if settings.BOT_API_LOCAL:
+            raise ValueError("BOT_API_URL must be set when BOT_API_LOCAL is enabled.")
+        return None
+
+    api = TelegramAPIServer.from_base(
+        settings.BOT_API_URL,
+        is_local=settings.BOT_API_LOCAL,
+        # Maps the paths of the files passed by path to where the server sees them.
+        # Absolute, since the paths of the files are made absolute before they are mapped
+        wrap_local_file=SimpleFilesPathWrapper(
+            server_path=Path(os.path.abspath(settings.BOT_API_SCRATCH_DIR or settings.SCRATCH_DIR)),
+            local_path=Path(os.path.abspath(settings.SCRATCH_DIR)),
+        ),
+    )
+    logger.info(f"Using the Bot API server at {settings.BOT_API_URL}" + (" in local mode" if api.is_local else ""))
+    return AiohttpSession(api=api)
+
 bot = Bot(
     token=settings.BOT_TOKEN,
+    session=get_session(),
     default=DefaultBotProperties(parse_mode=ParseMode.HTML),
 )
 
@@ -32,5 +64,49 @@ async def init_bot():
         BotCommand(command="/help", description="Get help"),
         BotCommand(command="/settings", description="Change settings",),
     ])
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
\ No newline at end of file
+
+    if settings.BOT_MODE == "webhook":
+        await start_webhook()
+    else:
+        # Serves the routes of the other components, e.g. the metrics
+        await init_web()
+        await bot.delete_webhook(drop_pending_updates=True)
+        await dp.start_polling(bot)
+
+async def start_webhook():
+    """
+    Receive updates on the web server instead of polling for them.
+
+    Telegram gets its 200 as soon as the update is read, the handlers run in the background,
+    at most WEBHOOK_CONCURRENCY of them at once.
+    """
+    if not settings.WEBHOOK_URL or not settings.WEBHOOK_SECRET:
+        raise ValueError("WEBHOOK_URL and WEBHOOK_SECRET must be set in webhook mode.")
+
+    update_slots = asyncio.Semaphore(settings.WEBHOOK_CONCURRENCY)
+
+    async def limit_concurrency(handler, event, data):
+        async with update_slots:
+            return await handler(event, data)
+
+    dp.update.outer_middleware(limit_concurrency)
+
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=settings.WEBHOOK_SECRET,
+    ).register(app, path=settings.WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    await init_web()
+    await bot.set_webhook(
+        url=settings.WEBHOOK_URL,
+        secret_token=settings.WEBHOOK_SECRET,
+        max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    logger.info(f"Receiving updates on {settings.WEBHOOK_URL}")
+
+    # Serve until the process is stopped
+    await asyncio.Event().wait()
\ No newline at end of file
@@ -0,0 +1,30 @@
+import asyncio
+import os
+
+from config import settings
+from services.cache import DiskLRUCache
+
+thumbnail_cache = DiskLRUCache(
+    directory=os.path.join(settings.CACHE_DIR, "thumbnails"),
+    max_bytes=settings.THUMBNAIL_CACHE_SIZE_MB * 1024 * 1024,
+)
+audio_cache = DiskLRUCache(
+    directory=os.path.join(settings.CACHE_DIR, "audio"),
+    max_bytes=settings.AUDIO_CACHE_SIZE_MB * 1024 * 1024,
+)
+
+async def init_cache():
+    """
+    Load the indexes of the on-disk caches.
+    """
+    await asyncio.to_thread(thumbnail_cache.load)
+    if settings.AUDIO_CACHE_SIZE_MB:
+        await asyncio.to_thread(audio_cache.load)
+
+async def close_cache():
+    """
+    Save the indexes of the on-disk caches, with the entries used since they were last saved.
+    """
+    await asyncio.to_thread(thumbnail_cache.save_index)
+    if settings.AUDIO_CACHE_SIZE_MB:
+        await asyncio.to_thread(audio_cache.save_index)
@@ -1,4 +1,7 @@
+from pymongo.errors import OperationFailure
+
 from config import settings
+from config.logging_conf import logger
 from services.mongo import MongoService
 
 _client = MongoService(
@@ -10,6 +13,17 @@ db = _client.db
 
 async def init_db():
     """
-    Initialize the database connection.
+    Initialize the database connection and ensure the indexes of all models.
     """
-    await _client.init_db()
\ No newline at end of file
+    await _client.init_db()
+
+    # Imported here, the models depend on this module
+    from core.orm.models import BaseORMModel
+    from db import models  # noqa
+
+    for model in BaseORMModel.all_models():
+        try:
+            await model.ensure_indexes()
+        except OperationFailure as e:
+            # e.g. duplicates violating a new unique index, the bot can still run without it
+            logger.error(f"Failed to ensure indexes of {model.__name__}: {e}")
\ No newline at end of file
@@ -1,19 +1,54 @@
 import asyncio
 
+from config import settings
 from core.bot import init_bot
+from core.cache import init_cache, close_cache
 from config.logging_conf import logger
 from core.db import init_db
+from core.metrics import init_metrics
+from core.scheduler import init_scheduler
+from core.scratch import init_scratch, stop_scratch
+from core.web import init_web, stop_web
+from core.worker import init_worker, stop_worker
+from services.http import HTTPClient
+from services.telethon import TelethonService
 
 
 async def main() -> None:
     try:
         await init_db()
-        await init_bot()
+        await init_metrics()
+
+        # Dispatchers only queue the jobs, the downloads run on the workers
+        if settings.RUN_MODE != "dispatcher":
+            await init_cache()
+            await init_scratch()
+            await init_scheduler()
+            # With a local Bot API server, the user session is only needed for streaming and files above 2000 MB,
+            # and is started on first use
+            if not settings.BOT_API_LOCAL or settings.STREAMING_UPLOADS:
+                await TelethonService.start_client()
+            await init_worker()
+
+        if settings.RUN_MODE == "worker":
+            await init_web()
+            # Serve until the process is stopped
+            await asyncio.Event().wait()
+        else:
+            await init_bot()
     except Exception as e:
         logger.error(f"Fatal error in main process: {e}")
         raise
     finally:
         logger.info("Shutting down all services...")
+        # Running jobs are cancelled and put back into the queue before the clients they use are closed
+        await stop_worker()
+        await stop_scratch()
+        if settings.RUN_MODE != "dispatcher":
+            await close_cache()
+        await stop_web()
+        await TelethonService.stop_client()
+        await HTTPClient.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,124 @@
+from aiohttp import web
+
+from config import settings
+from config.logging_conf import logger
+from core.cache import audio_cache, thumbnail_cache
+from core.scheduler import scheduler
+from core.scratch import scratch
+from core.web import app
+from db.models import Job, User
+from services.metadata_cache import MetadataCacheService
+from services.metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+registry = MetricsRegistry()
+
+# Durations of the pipeline stages: extract, download, transcode, thumbnail,
+# upload_bot_api, upload_mtproto and stream
+stage_seconds = registry.register(Histogram(
+    'musicbot_stage_seconds', "Duration of the download pipeline stages.", ('stage',),
+))
+job_seconds = registry.register(Histogram(
+    'musicbot_job_seconds', "Total duration of the jobs.", ('kind', 'status'),
+    buckets=(1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 3600),
+))
+bytes_transferred = registry.register(Counter(
+    'musicbot_bytes_total', "Bytes downloaded from the sources and uploaded to Telegram.", ('direction',),
+))
+errors = registry.register(Counter(
+    'musicbot_errors_total', "Errors of the jobs by source and exception type.", ('source', 'type'),
+))
+media_cache_requests = registry.register(Counter(
+    'musicbot_media_cache_requests_total', "Lookups of already uploaded audio.", ('result',),
+))
+
+registry.register(Gauge(
+    'musicbot_scheduler_queue_depth', "Jobs waiting for a local worker.",
+    callback=lambda: scheduler.queue_depth,
+))
+registry.register(Gauge(
+    'musicbot_scheduler_running', "Jobs running on the local workers.",
+    callback=lambda: scheduler.running,
+))
+registry.register(Gauge(
+    'musicbot_scratch_bytes', "Bytes used by the files in the scratch directory, measured periodically.",
+    callback=lambda: scratch.used_bytes,
+))
+registry.register(Gauge(
+    'musicbot_scratch_reserved_bytes', "Bytes of the scratch quota reserved by the running jobs.",
+    callback=lambda: scratch.reserved,
+))
+registry.register(Gauge(
+    'musicbot_scratch_quota_bytes', "Scratch quota, 0 if there is none.",
+    callback=lambda: scratch.max_bytes,
+))
+registry.register(Gauge(
+    'musicbot_scratch_jobs', "Jobs with a scratch directory.",
+    callback=lambda: scratch.active,
+))
+registry.register(Counter(
+    'musicbot_scratch_swept_bytes_total', "Bytes of abandoned files removed from the scratch directory.",
+    callback=lambda: scratch.swept_bytes,
+))
+registry.register(Counter(
+    'musicbot_cache_requests_total', "Lookups of the in-process caches.", ('cache', 'result'),
+    callback=lambda: _get_cache_requests(),
+))
+jobs = registry.register(Gauge(
+    'musicbot_jobs', "Jobs in the shared queue by status, finished ones are kept for a week.", ('status',),
+))
+
+# Modules whose errors are reported under their own source
+ERROR_SOURCES = {
+    'aiogram': 'telegram',
+    'telethon': 'telegram',
+    'yt_dlp': 'yt_dlp',
+}
+
+def record_error(error: BaseException) -> None:
+    """
+    Count the error by where it came from and its type.
+    """
+    module = type(error).__module__.split('.')[0]
+    errors.inc(source=ERROR_SOURCES.get(module, 'other'), type=type(error).__name__)
+
+async def init_metrics():
+    """
+    Serve the metrics on METRICS_PATH of the web server, if enabled.
+    """
+    if not settings.METRICS_ENABLED:
+        return
+
+    app.router.add_get(settings.METRICS_PATH, _handle_metrics)
+    logger.info(f"Serving metrics on {settings.METRICS_PATH}")
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    # The queue is shared by all processes, so it is counted in MongoDB on every scrape
+    try:
+        cursor = await Job.collection.aggregate([{'$group': {'_id': '$status', 'count': {'$sum': 1}}}])
+        counts = {group['_id']: group['count'] async for group in cursor}
+        for status in ('queued', 'running', 'done', 'failed'):
+            jobs.set(counts.get(status, 0), status=status)
+    except Exception as e:
+        logger.error(f"Failed to count the jobs: {e}")
+
+    return web.Response(
+        body=registry.render().encode(),
+        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'},
+    )
+
+def _get_cache_requests() -> dict[tuple[str, str], int]:
+    requests = {}
+    caches = (
+        ('thumbnail', thumbnail_cache),
+        ('audio', audio_cache),
+        ('metadata', MetadataCacheService.memory),
+    )
+    for name, cache in caches:
+        requests[(name, 'hit')] = cache.hits
+        requests[(name, 'miss')] = cache.misses
+
+    # Models may have no cache, their stats are zero then
+    stats = User.cache_stats()
+    requests[('user', 'hit')] = stats['hits']
+    requests[('user', 'miss')] = stats['misses']
+    return requests
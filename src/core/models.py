@@ -37,6 +37,10 @@ class TimestampedModel(BaseORMModel):
         update_data['updated_at'] = get_current_time()
         return await super().update(query, update_data)
 
+    @classmethod
+    def _get_write_timestamps(cls) -> dict:
+        return {'updated_at': get_current_time()}
+
 
 class SoftDeleteModel(BaseORMModel):
     deleted_at: datetime.datetime | None = Field(default=None, description="Timestamp when the record was soft deleted")
@@ -1,30 +1,74 @@
-from typing import ClassVar, Self
+import time
+from itertools import islice
+from typing import AsyncIterator, ClassVar, Hashable, Iterable, Self
 
-from pydantic import BaseModel
-from pymongo import ReturnDocument
+from bson import ObjectId
+from pydantic import BaseModel, Field, ValidationError
+from pymongo import ReturnDocument, InsertOne, UpdateOne, IndexModel
 from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.errors import BulkWriteError
 
+from config import settings
+from config.logging_conf import logger
+from core.orm.cache import LRUCache
 from core.orm.descriptors import CollectionDescriptor
 
+_MISSING = object()
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_CURSOR_BATCH_SIZE = 500
+
+
+class BulkItemError(BaseModel):
+    index: int = Field(..., description="Index of the failed item in the input")
+    code: int | None = Field(default=None, description="MongoDB error code, None for validation errors")
+    message: str = Field(..., description="Error message")
+
+
+class BulkResult(BaseModel):
+    inserted: int = Field(default=0, description="Number of inserted documents")
+    matched: int = Field(default=0, description="Number of documents matched by updates")
+    modified: int = Field(default=0, description="Number of modified documents")
+    upserted: int = Field(default=0, description="Number of documents inserted by upserts")
+    errors: list[BulkItemError] = Field(default_factory=list, description="Errors of the failed items")
+
 
 class BaseORMModel(BaseModel):
     db_collection: ClassVar[str] = '_'
     collection: ClassVar[AsyncCollection] = CollectionDescriptor()
 
+    # Indexes created by `ensure_indexes` at startup
+    indexes: ClassVar[list[IndexModel]] = []
+
+    # Read-through cache of `get` and `get_or_create`, disabled unless set by the model
+    cache: ClassVar[LRUCache | None] = None
+    # Whether lookups that found nothing are cached as well
+    cache_negative: ClassVar[bool] = False
+
     @classmethod
     async def get(cls, **kwargs) -> Self | None:
 
         if not kwargs:
             raise ValueError(f"{cls.__name__}: No criteria provided for retrieval.")
 
+        cache_key = cls._get_cache_key(kwargs)
+        if cache_key is not None:
+            cached = cls.cache.get(cache_key, _MISSING)
+            if cached is not _MISSING:
+                return cached
+
         # Handle soft deletion fields
-        if hasattr(cls, 'deleted_at') and 'deleted_at' not in kwargs:
-            kwargs['deleted_at'] = None
-        elif hasattr(cls, 'is_deleted') and 'is_deleted' not in kwargs:
-            kwargs['is_deleted'] = False
+        cls._exclude_soft_deleted(kwargs)
 
+        started = time.perf_counter()
         document = await cls.collection.find_one(kwargs)
-        return cls.model_validate(document) if document else None
+        await cls._profile(kwargs, started)
+        obj = cls.model_validate(document) if document else None
+
+        if cache_key is not None and (obj is not None or cls.cache_negative):
+            cls.cache.set(cache_key, obj)
+
+        return obj
 
     @classmethod
     async def filter(
@@ -39,10 +83,7 @@ class BaseORMModel(BaseModel):
             raise ValueError(f"{cls.__name__}: No criteria provided for filtering.")
 
         # Handle soft deletion fields
-        if hasattr(cls, 'deleted_at') and 'deleted_at' not in query:
-            query['deleted_at'] = None
-        elif hasattr(cls, 'is_deleted') and 'is_deleted' not in query:
-            query['is_deleted'] = False
+        cls._exclude_soft_deleted(query)
 
         cursor = cls.collection.find(query, projection=projection)
         if sort:
@@ -50,9 +91,88 @@ class BaseORMModel(BaseModel):
         if limit:
             cursor = cursor.limit(limit)
 
+        started = time.perf_counter()
         document = await cursor.to_list(length=None)
+        await cls._profile(query, started)
         return [cls.model_validate(doc) for doc in document] if document else []
 
+    @classmethod
+    async def iterate(
+            cls,
+            query: dict = None,
+            projection: dict = None,
+            sort: list = None,
+            limit: int = None,
+            batch_size: int = DEFAULT_CURSOR_BATCH_SIZE,
+            raw: bool = False
+    ) -> AsyncIterator[Self | dict]:
+        """
+        Iterate over the matching documents without loading them all into memory.
+
+        Documents are fetched `batch_size` at a time and turned into models one by one.
+        With a projection the models are partial: they are built without validation and the fields
+        outside the projection are left unset, so reading them raises AttributeError instead of
+        returning a made-up default. With `raw` the documents are yielded as they are.
+        An empty query iterates over the whole collection.
+        """
+        query = cls._exclude_soft_deleted(dict(query or {}))
+
+        cursor = cls.collection.find(query, projection=projection, batch_size=batch_size)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+
+        try:
+            async for document in cursor:
+                yield cls._hydrate(document, raw=raw, partial=projection is not None)
+        finally:
+            await cursor.close()
+
+    @classmethod
+    async def paginate(
+            cls,
+            query: dict = None,
+            after: ObjectId | None = None,
+            limit: int = 100,
+            projection: dict = None,
+            raw: bool = False
+    ) -> tuple[list[Self | dict], ObjectId | None]:
+        """
+        Get a page of documents ordered by `_id`, starting after the given ID.
+
+        Unlike skip-based pagination, every page costs the same regardless of its position.
+
+        :return: The page, and the `after` value of the next page, or None if this page is the last one.
+        """
+        query = dict(query or {})
+        if after is not None:
+            query['_id'] = {'$gt': after}
+
+        if projection is not None:
+            # The ID is needed for the next cursor, raw pages included
+            projection = {**projection, '_id': 1}
+
+        query = cls._exclude_soft_deleted(query)
+        cursor = cls.collection.find(query, projection=projection).sort([('_id', 1)]).limit(limit)
+        documents = await cursor.to_list(length=limit)
+
+        next_after = documents[-1]['_id'] if len(documents) == limit else None
+        page = [cls._hydrate(document, raw=raw, partial=projection is not None) for document in documents]
+        return page, next_after
+
+    @classmethod
+    def _hydrate(cls, document: dict, raw: bool = False, partial: bool = False) -> Self | dict:
+        if raw:
+            return document
+        if partial:
+            obj = cls.model_construct(**document)
+            # Drop the defaults filled in for the fields that were not projected, e.g. fresh timestamps
+            for name in cls.model_fields.keys() - obj.model_fields_set:
+                obj.__dict__.pop(name, None)
+            return obj
+        return cls.model_validate(document)
+
     @classmethod
     async def create(cls, **kwargs) -> Self:
 
@@ -61,6 +181,7 @@ class BaseORMModel(BaseModel):
 
         obj = cls(**kwargs) # noqa
         await cls.collection.insert_one(obj.model_dump())
+        cls._invalidate_negative()
         return obj
 
     @classmethod
@@ -72,11 +193,14 @@ class BaseORMModel(BaseModel):
         if not update_data:
             raise ValueError("No update data provided.")
 
+        started = time.perf_counter()
         document = await cls.collection.find_one_and_update(
             filter=query,
             update={'$set': update_data},
             return_document=ReturnDocument.AFTER
         )
+        await cls._profile(query, started)
+        cls.invalidate_cache(query)
         return cls.model_validate(document) if document else None
 
     @classmethod
@@ -85,7 +209,9 @@ class BaseORMModel(BaseModel):
         if not kwargs:
             raise ValueError(f"{cls.__name__}: No criteria provided for deletion.")
 
-        if hasattr(cls, 'deleted_at'):
+        cls.invalidate_cache(kwargs)
+
+        if 'deleted_at' in cls.model_fields:
             return await cls._soft_delete(many=many, **kwargs)
 
         return await cls._hard_delete(many=many, **kwargs)
@@ -118,13 +244,12 @@ class BaseORMModel(BaseModel):
             raise ValueError(f"{cls.__name__}: No criteria provided for exists check.")
 
         # Include soft-deletion filtering
-        if hasattr(cls, 'deleted_at') and 'deleted_at' not in kwargs:
-            kwargs['deleted_at'] = None
-        elif hasattr(cls, 'is_deleted') and 'is_deleted' not in kwargs:
-            kwargs['is_deleted'] = False
+        cls._exclude_soft_deleted(kwargs)
 
+        started = time.perf_counter()
         document = await cls.collection.find_one(kwargs, projection={
             "_id": 1 })
+        await cls._profile(kwargs, started)
         return document is not None
 
     @classmethod
@@ -133,13 +258,322 @@ class BaseORMModel(BaseModel):
         if not kwargs:
             raise ValueError(f"{cls.__name__}: No criteria provided for get_or_create.")
 
+        cache_key = cls._get_cache_key(kwargs)
+        if cache_key is not None:
+            cached = cls.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
         create_data = {**defaults, **kwargs} if defaults else kwargs
 
         obj = cls(**create_data) # noqa
+        started = time.perf_counter()
         document = await cls.collection.find_one_and_update(
             filter=kwargs,
             update={'$setOnInsert': obj.model_dump() or {}},
             upsert=True,
             return_document=ReturnDocument.AFTER
         )
-        return cls.model_validate(document) if document else None
\ No newline at end of file
+        await cls._profile(kwargs, started)
+        obj = cls.model_validate(document) if document else None
+
+        if cache_key is not None and obj is not None:
+            cls._invalidate_negative()
+            cls.cache.set(cache_key, obj)
+
+        return obj
+
+    @classmethod
+    async def ensure_indexes(cls) -> None:
+        """
+        Create the declared indexes. Existing indexes with the same definition are left as they are.
+        """
+        if not cls.indexes:
+            return
+
+        names = await cls.collection.create_indexes(cls.indexes)
+        logger.info(f"{cls.__name__}: ensured indexes {', '.join(names)}")
+
+    @classmethod
+    def all_models(cls) -> list[type['BaseORMModel']]:
+        """
+        Get all imported models that are bound to a collection.
+        """
+        models = []
+        for subclass in cls.__subclasses__():
+            if subclass.db_collection != '_' and subclass not in models:
+                models.append(subclass)
+            models.extend(model for model in subclass.all_models() if model not in models)
+        return models
+
+    @classmethod
+    async def _profile(cls, query: dict, started: float) -> None:
+        """
+        Log slow queries and queries that scan the whole collection, if profiling is enabled.
+        """
+        if not settings.ORM_PROFILE:
+            return
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms > settings.ORM_SLOW_QUERY_MS:
+            logger.warning(f"{cls.__name__}: slow query ({elapsed_ms:.1f} ms): {query}")
+
+        try:
+            plan = await cls.collection.find(query).explain()
+        except Exception as e:
+            logger.warning(f"{cls.__name__}: failed to explain query {query}: {e}")
+            return
+
+        if 'COLLSCAN' in cls._get_plan_stages(plan.get('queryPlanner', {}).get('winningPlan', {})):
+            logger.warning(f"{cls.__name__}: query does a collection scan: {query}")
+
+    @classmethod
+    def _get_plan_stages(cls, plan) -> set[str]:
+        stages = set()
+        if isinstance(plan, dict):
+            if 'stage' in plan:
+                stages.add(plan['stage'])
+            for value in plan.values():
+                stages |= cls._get_plan_stages(value)
+        elif isinstance(plan, list):
+            for value in plan:
+                stages |= cls._get_plan_stages(value)
+        return stages
+
+    @classmethod
+    async def bulk_create(
+            cls,
+            items: list[dict],
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            ordered: bool = True
+    ) -> BulkResult:
+        """
+        Insert many documents with `insert_many`, `batch_size` documents per round trip.
+
+        Ordered writes stop at the first failed item, unordered ones write all valid items.
+        """
+        result = BulkResult()
+
+        documents = []
+        for index, item in enumerate(items):
+            try:
+                documents.append((index, cls(**item).model_dump()))
+            except ValidationError as e:
+                result.errors.append(BulkItemError(index=index, message=str(e)))
+                if ordered:
+                    break
+
+        for batch in cls._batched(documents, batch_size):
+            indexes = [index for index, _ in batch]
+            try:
+                response = await cls.collection.insert_many([document for _, document in batch], ordered=ordered)
+                result.inserted += len(response.inserted_ids)
+            except BulkWriteError as e:
+                result.inserted += e.details.get('nInserted', 0)
+                cls._collect_bulk_errors(result, e, indexes)
+                if ordered:
+                    break
+
+        cls._invalidate_negative()
+        result.errors.sort(key=lambda error: error.index)
+        return result
+
+    @classmethod
+    async def bulk_upsert(
+            cls,
+            items: list[dict],
+            key_fields: list[str],
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            ordered: bool = True
+    ) -> BulkResult:
+        """
+        Insert or update many documents, matching existing ones by `key_fields`.
+
+        Fields given in the item, by name or alias, are set on existing documents, the remaining
+        defaults of the model are only written when the document is inserted. Fields excluded
+        from the documents, such as `_id`, can only be matched on.
+        """
+        result = BulkResult()
+        fields = cls._get_field_names()
+
+        operations = []
+        for index, item in enumerate(items):
+            try:
+                document = cls(**item).model_dump()
+                query = cls._exclude_soft_deleted({field: item[field] for field in key_fields})
+            except (ValidationError, KeyError) as e:
+                result.errors.append(BulkItemError(index=index, message=str(e)))
+                if ordered:
+                    break
+                continue
+
+            set_data = {
+                fields[key]: document[fields[key]]
+                for key in item
+                if key not in query and fields.get(key) in document and fields[key] not in query
+            }
+            set_data.update(cls._get_write_timestamps())
+            insert_data = {key: value for key, value in document.items() if key not in set_data and key not in query}
+
+            update = {'$set': set_data} if set_data else {}
+            if insert_data:
+                update['$setOnInsert'] = insert_data
+
+            operations.append((index, UpdateOne(query, update, upsert=True)))
+
+        await cls._bulk_write(operations, batch_size, ordered, result)
+        cls.invalidate_cache()
+        return result
+
+    @classmethod
+    async def bulk_update(
+            cls,
+            updates: list[tuple[dict, dict]],
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            ordered: bool = True
+    ) -> BulkResult:
+        """
+        Apply many `(query, update_data)` updates, each to the first matching document.
+        """
+        result = BulkResult()
+
+        operations = []
+        for index, (query, update_data) in enumerate(updates):
+            if not query or not update_data:
+                result.errors.append(BulkItemError(index=index, message="No criteria or update data provided."))
+                if ordered:
+                    break
+                continue
+
+            update_data = {**update_data, **cls._get_write_timestamps()}
+            operations.append((index, UpdateOne(cls._exclude_soft_deleted(dict(query)), {'$set': update_data})))
+
+        await cls._bulk_write(operations, batch_size, ordered, result)
+        cls.invalidate_cache()
+        return result
+
+    @classmethod
+    async def _bulk_write(
+            cls,
+            operations: list[tuple[int, InsertOne | UpdateOne]],
+            batch_size: int,
+            ordered: bool,
+            result: BulkResult
+    ) -> None:
+        for batch in cls._batched(operations, batch_size):
+            indexes = [index for index, _ in batch]
+            try:
+                response = await cls.collection.bulk_write([operation for _, operation in batch], ordered=ordered)
+                result.inserted += response.inserted_count
+                result.matched += response.matched_count
+                result.modified += response.modified_count
+                result.upserted += response.upserted_count
+            except BulkWriteError as e:
+                result.inserted += e.details.get('nInserted', 0)
+                result.matched += e.details.get('nMatched', 0)
+                result.modified += e.details.get('nModified', 0)
+                result.upserted += e.details.get('nUpserted', 0)
+                cls._collect_bulk_errors(result, e, indexes)
+                if ordered:
+                    break
+
+        result.errors.sort(key=lambda error: error.index)
+
+    @staticmethod
+    def _collect_bulk_errors(result: BulkResult, error: BulkWriteError, indexes: list[int]) -> None:
+        """
+        Map the write errors of a batch back to the indexes of the input items.
+        """
+        for write_error in error.details.get('writeErrors', []):
+            result.errors.append(BulkItemError(
+                index=indexes[write_error['index']],
+                code=write_error.get('code'),
+                message=write_error.get('errmsg', ''),
+            ))
+
+    @staticmethod
+    def _batched(items: Iterable, batch_size: int) -> Iterable[list]:
+        iterator = iter(items)
+        while batch := list(islice(iterator, batch_size)):
+            yield batch
+
+    @classmethod
+    def _get_write_timestamps(cls) -> dict:
+        """
+        Fields to set on every write, overridden by timestamped models.
+        """
+        return {}
+
+    @classmethod
+    def _exclude_soft_deleted(cls, query: dict) -> dict:
+        """
+        Restrict the query to documents that are not soft deleted, unless it filters on deletion itself.
+        """
+        if 'deleted_at' in cls.model_fields and 'deleted_at' not in query:
+            query['deleted_at'] = None
+        elif 'is_deleted' in cls.model_fields and 'is_deleted' not in query:
+            query['is_deleted'] = False
+        return query
+
+    @classmethod
+    def cache_stats(cls) -> dict[str, int]:
+        """
+        Get the hit and miss counters of the model cache.
+        """
+        if cls.cache is None:
+            return {'hits': 0, 'misses': 0, 'size': 0}
+        return {'hits': cls.cache.hits, 'misses': cls.cache.misses, 'size': len(cls.cache)}
+
+    @classmethod
+    def invalidate_cache(cls, query: dict = None) -> None:
+        """
+        Drop the cached objects matching the query, or all cached objects if no query is given.
+
+        Queries with operators or keys that are not fields, e.g. dotted paths, cannot be matched
+        against cached objects, so they clear the whole cache. Keys may be field names or aliases.
+        """
+        if cls.cache is None:
+            return
+
+        fields = cls._get_field_names()
+        if not query or any(key not in fields or isinstance(value, dict) for key, value in query.items()):
+            cls.cache.clear()
+            return
+
+        criteria = [(fields[key], value) for key, value in query.items()]
+        for key, obj in cls.cache.items():
+            if obj is None or all(getattr(obj, field, _MISSING) == value for field, value in criteria):
+                cls.cache.pop(key)
+
+    @classmethod
+    def _get_field_names(cls) -> dict[str, str]:
+        """
+        Map the field names and aliases of the model to the field names.
+        """
+        fields = {field.alias or name: name for name, field in cls.model_fields.items()}
+        fields.update((name, name) for name in cls.model_fields)
+        return fields
+
+    @classmethod
+    def _invalidate_negative(cls) -> None:
+        if cls.cache is None or not cls.cache_negative:
+            return
+
+        for key, obj in cls.cache.items():
+            if obj is None:
+                cls.cache.pop(key)
+
+    @classmethod
+    def _get_cache_key(cls, criteria: dict) -> Hashable | None:
+        """
+        Build the cache key of the lookup criteria, or None if the lookup cannot be cached.
+        """
+        if cls.cache is None:
+            return None
+
+        key = tuple(sorted(criteria.items()))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
@@ -0,0 +1,38 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from config import settings
+from services.scheduler import JobScheduler
+
+scheduler = JobScheduler(
+    workers=settings.MAX_WORKERS,
+    per_user=settings.MAX_JOBS_PER_USER,
+    queue_size=settings.MAX_QUEUE_SIZE,
+    pools={
+        'extract': settings.EXTRACT_CONCURRENCY,
+        'download': settings.DOWNLOAD_CONCURRENCY,
+        'transcode': settings.TRANSCODE_CONCURRENCY,
+        'upload': settings.UPLOAD_CONCURRENCY,
+    }
+)
+
+async def init_scheduler():
+    """
+    Start the job scheduler workers.
+    """
+    # Size the thread pool used by asyncio.to_thread to the blocking stages it has to serve
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(
+            max_workers=(
+                settings.EXTRACT_CONCURRENCY + settings.DOWNLOAD_CONCURRENCY + settings.TRANSCODE_CONCURRENCY + 4
+            ),
+            thread_name_prefix="download",
+        )
+    )
+    await scheduler.start()
+
+async def stop_scheduler():
+    """
+    Cancel the scheduler workers, along with the jobs they are running.
+    """
+    await scheduler.stop()
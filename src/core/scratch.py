@@ -0,0 +1,53 @@
+import asyncio
+
+from config import settings
+from config.logging_conf import logger
+from services.scratch import ScratchSpace
+
+# Seconds between two sweeps of the files left by crashed jobs
+SWEEP_INTERVAL = 600
+# Seconds between two measurements of the bytes used in the scratch directory
+USAGE_INTERVAL = 30
+
+scratch = ScratchSpace(
+    directory=settings.SCRATCH_DIR,
+    max_bytes=settings.SCRATCH_QUOTA_MB * 1024 * 1024,
+    job_bytes=settings.SCRATCH_JOB_RESERVE_MB * 1024 * 1024,
+    max_age=settings.SCRATCH_MAX_AGE_SECONDS,
+)
+
+_tasks: list[asyncio.Task] = []
+
+async def init_scratch():
+    """
+    Start sweeping the scratch directory for files left by crashed jobs, and measuring its usage.
+    """
+    _tasks.append(asyncio.create_task(_sweep()))
+    _tasks.append(asyncio.create_task(_measure()))
+    logger.info(f"Scratch space in {settings.SCRATCH_DIR}, {settings.SCRATCH_QUOTA_MB} MB quota.")
+
+async def stop_scratch():
+    """
+    Stop the sweeper and the measurements.
+    """
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+
+async def _sweep():
+    while True:
+        try:
+            await asyncio.to_thread(scratch.sweep)
+        except Exception as e:
+            logger.error(f"Failed to sweep the scratch directory: {e}")
+        await asyncio.sleep(SWEEP_INTERVAL)
+
+async def _measure():
+    # Walking the directory may take a while, so it is done off the loop instead of on every scrape
+    while True:
+        try:
+            await asyncio.to_thread(scratch.usage)
+        except Exception as e:
+            logger.error(f"Failed to measure the scratch directory: {e}")
+        await asyncio.sleep(USAGE_INTERVAL)
@@ -4,11 +4,29 @@ class AudioMetadata(BaseModel):
     artist: str = Field(..., description="Artist of the audio")
     title: str = Field(..., description="Title of the audio")
     thumbnail_url: str = Field(..., description="URL of the thumbnail image")
+    duration: float | None = Field(default=None, description="Duration of the audio in seconds")
+    filesize: int | None = Field(default=None, description="Estimated size of the audio stream in bytes")
+
+class AudioFormat(BaseModel):
+    codec: str = Field(..., description="Codec passed to FFmpegExtractAudio")
+    extension: str = Field(..., description="Extension of the produced file")
+    mime_type: str = Field(..., description="MIME type of the produced file")
 
 class AudioData(BaseModel):
-    file_path: str = Field(default=None, description="Path to the audio file")
-    thumbnail_path: str = Field(default=None, description="Path to save the thumbnail image")
+    file_path: str | None = Field(default=None, description="Path to the audio file")
+    source_path: str | None = Field(default=None, description="Path to the downloaded source, until it is encoded")
+    mime_type: str = Field(default="audio/mpeg", description="MIME type of the audio file")
+    thumbnail_path: str | None = Field(default=None, description="Path to save the thumbnail image")
 
     artist: str = Field(..., description="Artist of the audio")
     title: str = Field(..., description="Title of the audio")
-    thumbnail_url: str = Field(..., description="URL of the thumbnail image")
\ No newline at end of file
+    thumbnail_url: str = Field(..., description="URL of the thumbnail image")
+
+class DownloadJob(BaseModel):
+    url: str = Field(..., description="URL of the audio to download")
+    urls: list[str] = Field(default_factory=list, description="URLs of the tracks or playlists of a batch download")
+    video_id: str | None = Field(default=None, description="Canonical ID of the video")
+    user_id: int = Field(..., description="ID of the user who requested the download")
+    chat_id: int = Field(..., description="ID of the chat the request came from")
+    message_id: int = Field(..., description="ID of the message with the URL")
+    status_message_id: int = Field(..., description="ID of the message showing the job status")
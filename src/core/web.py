@@ -0,0 +1,34 @@
+from aiohttp import web
+
+from config import settings
+from config.logging_conf import logger
+
+# Routes are added by the components served over HTTP before `init_web` is called
+app = web.Application()
+
+_runner: web.AppRunner | None = None
+
+async def init_web():
+    """
+    Start serving the web application on WEB_HOST:WEB_PORT,
+    unless it is already served or has no routes.
+    """
+    global _runner
+
+    if _runner is not None or not len(app.router.routes()):
+        return
+
+    _runner = web.AppRunner(app)
+    await _runner.setup()
+    await web.TCPSite(_runner, settings.WEB_HOST, settings.WEB_PORT).start()
+    logger.info(f"Web server listening on {settings.WEB_HOST}:{settings.WEB_PORT}")
+
+async def stop_web():
+    """
+    Stop the web server if it was started.
+    """
+    global _runner
+
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
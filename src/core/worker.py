@@ -0,0 +1,154 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from aiogram import Bot
+
+from config import settings
+from config.logging_conf import logger
+from core.bot import bot
+from core.metrics import job_seconds, record_error
+from core.scheduler import scheduler, stop_scheduler
+from core.scratch import scratch
+from db.models import Job
+from services.batch import BatchPipeline
+from services.job_queue import JobQueue
+from services.pipeline import DownloadPipeline
+from services.scheduler import QueueFullError, UserLimitError
+
+RUNNERS: dict[str, Callable[[Bot, Job], Awaitable]] = {
+    'single': DownloadPipeline.run,
+    'batch': BatchPipeline.run,
+}
+
+_task: asyncio.Task | None = None
+# Jobs claimed by this worker and not finished yet, by ID
+_claimed: dict[str, Job] = {}
+
+async def init_worker():
+    """
+    Start taking jobs from the queue and running them on the local scheduler.
+    """
+    global _task
+
+    # Resume the jobs this worker was running before a restart
+    recovered = await JobQueue.recover(settings.WORKER_ID)
+    if recovered:
+        logger.info(f"Worker {settings.WORKER_ID}: resuming {recovered} interrupted jobs.")
+
+    _task = asyncio.create_task(_poll())
+    logger.info(f"Worker {settings.WORKER_ID} started.")
+
+async def stop_worker():
+    """
+    Stop taking jobs, and cancel the jobs already claimed before the clients they use are closed.
+    The cancelled jobs are put back into the queue, to be resumed after their last completed stage.
+    """
+    global _task
+
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+
+    await stop_scheduler()
+
+    for job in list(_claimed.values()):
+        try:
+            await JobQueue.release(job)
+        except Exception as e:
+            logger.error(f"Failed to release job {job.id}: {e}")
+    if _claimed:
+        logger.info(f"Worker {settings.WORKER_ID}: released {len(_claimed)} unfinished jobs.")
+    _claimed.clear()
+
+async def _poll():
+    last_sweep = 0.0
+
+    while True:
+        if time.monotonic() - last_sweep >= settings.JOB_LEASE_SECONDS:
+            last_sweep = time.monotonic()
+            await _fail_abandoned()
+
+        # Only claim as many jobs as the local workers can start right away,
+        # and leave them to other workers while the scratch quota is used up
+        if scheduler.running + scheduler.queue_depth >= settings.MAX_WORKERS or not scratch.has_room():
+            await asyncio.sleep(settings.WORKER_POLL_INTERVAL)
+            continue
+
+        try:
+            # Jobs of users at their limit would only be released again, blocking the jobs queued after them
+            job = await JobQueue.claim(settings.WORKER_ID, exclude_users=scheduler.users_at_limit)
+        except Exception as e:
+            logger.error(f"Failed to claim a job: {e}")
+            await asyncio.sleep(settings.WORKER_POLL_INTERVAL)
+            continue
+
+        if job is None:
+            await JobQueue.wait(settings.WORKER_POLL_INTERVAL)
+            continue
+
+        try:
+            scheduler.submit(job.job.user_id, lambda job=job: _run(job))
+            _claimed[str(job.id)] = job
+        except (UserLimitError, QueueFullError):
+            await JobQueue.release(job)
+            await asyncio.sleep(settings.WORKER_POLL_INTERVAL)
+
+async def _run(job: Job) -> None:
+    heartbeat = asyncio.create_task(_heartbeat(job, asyncio.current_task()))
+    started = time.perf_counter()
+    status = None
+    shutdown = False
+    try:
+        await RUNNERS[job.kind](bot, job)
+        status = 'done'
+    except asyncio.CancelledError:
+        if not heartbeat.done() or heartbeat.cancelled() or not heartbeat.result():
+            # Cancelled by a shutdown, the job is released by `stop_worker`
+            shutdown = True
+            raise
+        # Cancelled by the heartbeat, the job belongs to another worker now
+        asyncio.current_task().uncancel()
+        logger.warning(f"Worker {settings.WORKER_ID}: stopped job {job.id} after losing its lease.")
+    except Exception as e:
+        status = 'failed'
+        record_error(e)
+        raise
+    finally:
+        heartbeat.cancel()
+        if not shutdown:
+            _claimed.pop(str(job.id), None)
+        if status is not None:
+            job_seconds.observe(time.perf_counter() - started, kind=job.kind, status=status)
+            await JobQueue.finish(job, status)
+
+async def _heartbeat(job: Job, task: asyncio.Task) -> bool:
+    """
+    Renew the lease of the job while it runs, and cancel its task if the lease is lost.
+
+    :return: True if the task was cancelled.
+    """
+    while True:
+        await asyncio.sleep(settings.JOB_LEASE_SECONDS / 3)
+        try:
+            if not await JobQueue.heartbeat(job):
+                logger.warning(f"Worker {settings.WORKER_ID}: lost the lease of job {job.id}.")
+                task.cancel()
+                return True
+        except Exception as e:
+            logger.error(f"Failed to renew the lease of job {job.id}: {e}")
+
+async def _fail_abandoned() -> None:
+    """
+    Give up on the jobs that were interrupted too many times, and tell their users.
+    """
+    try:
+        jobs = await JobQueue.fail_abandoned()
+    except Exception as e:
+        logger.error(f"Failed to check for abandoned jobs: {e}")
+        return
+
+    for job in jobs:
+        logger.error(f"Job {job.id} was interrupted {job.attempts} times, giving up.")
+        await DownloadPipeline.edit_status(bot, job.job, "An error occurred")
@@ -1,9 +1,25 @@
+import datetime
+
+from config import settings
 from core.models import PyObjectId, TimestampedModel, SoftDeleteModel
+from core.templates import AudioData, DownloadJob
+from core.orm.cache import LRUCache
 
 from pydantic import Field
+from pymongo import ASCENDING, IndexModel
 
 class User(TimestampedModel, SoftDeleteModel):
     db_collection = 'users'
+    cache = LRUCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+    indexes = [
+        IndexModel([('user_id', ASCENDING), ('deleted_at', ASCENDING)], name='user_id_deleted_at'),
+        IndexModel(
+            [('user_id', ASCENDING)],
+            name='user_id_unique_active',
+            unique=True,
+            partialFilterExpression={'deleted_at': {'$type': 'null'}},
+        ),
+    ]
 
     id: PyObjectId | None = Field(default=None, alias="_id", exclude=True)
     user_id: int = Field(frozen=True)
@@ -15,9 +31,76 @@ class User(TimestampedModel, SoftDeleteModel):
 
 class Channel(TimestampedModel, SoftDeleteModel):
     db_collection = 'channels'
+    indexes = [
+        IndexModel([('channel_id', ASCENDING), ('deleted_at', ASCENDING)], name='channel_id_deleted_at'),
+        IndexModel([('user_id', ASCENDING), ('deleted_at', ASCENDING)], name='user_id_deleted_at'),
+    ]
 
     id: PyObjectId | None = Field(default=None, alias="_id", exclude=True)
     channel_id: int = Field(frozen=True)
     user_id: PyObjectId | None
     title: str
-    description: str | None
\ No newline at end of file
+    description: str | None
+
+
+class CachedMedia(TimestampedModel):
+    db_collection = 'media_cache'
+    indexes = [
+        IndexModel(
+            [('video_id', ASCENDING), ('audio_format', ASCENDING), ('bitrate', ASCENDING), ('channel_id', ASCENDING)],
+            name='video_format_channel_unique',
+            unique=True,
+        ),
+    ]
+
+    id: PyObjectId | None = Field(default=None, alias="_id", exclude=True)
+    video_id: str = Field(frozen=True)
+    audio_format: str = Field(frozen=True)
+    bitrate: int | None = Field(frozen=True)
+    channel_id: int
+    title: str
+    artist: str
+    file_id: str | None = Field(default=None, description="Bot API file_id of the uploaded audio")
+    file_unique_id: str | None = Field(default=None, description="Bot API file_unique_id of the uploaded audio")
+    message_id: int | None = Field(default=None, description="Channel message ID of the uploaded audio")
+    thumbnail_file_id: str | None = Field(default=None, description="Bot API file_id of the cover photo")
+
+
+class CachedMetadata(TimestampedModel):
+    db_collection = 'metadata_cache'
+    indexes = [
+        IndexModel([('video_id', ASCENDING)], name='video_id_unique', unique=True),
+        IndexModel([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=0),
+    ]
+
+    id: PyObjectId | None = Field(default=None, alias="_id", exclude=True)
+    video_id: str = Field(frozen=True)
+    artist: str
+    title: str
+    thumbnail_url: str
+    duration: float | None = None
+    filesize: int | None = None
+    expires_at: datetime.datetime = Field(description="Timestamp after which MongoDB removes the entry")
+
+
+class Job(TimestampedModel):
+    db_collection = 'jobs'
+    indexes = [
+        IndexModel([('status', ASCENDING), ('created_at', ASCENDING)], name='status_created_at'),
+        IndexModel([('status', ASCENDING), ('lease_expires_at', ASCENDING)], name='status_lease_expires_at'),
+        IndexModel([('job.user_id', ASCENDING), ('status', ASCENDING)], name='user_id_status'),
+        IndexModel([('finished_at', ASCENDING)], name='finished_at_ttl', expireAfterSeconds=7 * 24 * 3600),
+    ]
+
+    id: PyObjectId | None = Field(default=None, alias="_id", exclude=True)
+    kind: str = Field(frozen=True, description="'single' or 'batch'")
+    job: DownloadJob = Field(frozen=True)
+    status: str = Field(default='queued', description="queued, running, done or failed")
+    worker_id: str | None = Field(default=None, description="ID of the worker running the job")
+    lease_expires_at: datetime.datetime | None = Field(default=None, description="Other workers may take over the job after this")
+    attempts: int = Field(default=0, description="Number of times the job was claimed")
+    stage: str | None = Field(default=None, description="Last completed stage, see services.job_queue.STAGES")
+    audio_data: AudioData | None = Field(default=None, description="Files and metadata of the job, once downloaded")
+    audio_message_id: int | None = Field(default=None, description="Channel message ID of the audio, once uploaded")
+    started_at: datetime.datetime | None = None
+    finished_at: datetime.datetime | None = Field(default=None, description="MongoDB removes finished jobs a week later")
@@ -1,75 +1,114 @@
-import os
-
-from aiogram import types, Router, F, Bot
+from aiogram import types, Router, F
 
 from config.logging_conf import logger
-from services.yt_dlp import DLPService
-from utils.app_utils import upload_to_telegram, send_photo, upload_big_file
+from core.templates import DownloadJob
+from services.job_queue import JobQueue
+from services.media_cache import MediaCacheService
+from services.metadata_cache import MetadataCacheService
+from services.scheduler import QueueFullError, UserLimitError
+from utils.dlp_utils import get_video_id, extract_urls, is_supported_url, is_playlist_url
 
 router = Router()
 
 @router.message(F.text.startswith("https://"))
 async def download_audio(message: types.Message) -> None:
 
-    # Check if the message text is a valid YouTube URL
-    if (
-            message.text.startswith("https://www.youtube.com/watch?")
-            or message.text.startswith("https://youtu.be/")
-            or message.text.startswith("https://youtube.com/watch?")
-    ):
-        download_service = DLPService()
-    else:
+    # Check if the message contains only valid YouTube URLs
+    urls = extract_urls(message.text)
+    if not urls or not all(is_supported_url(url) for url in urls):
         await message.reply("Invalid URL")
         return None
 
+    # Playlists and messages with several links are downloaded as a batch
+    if len(urls) > 1 or is_playlist_url(urls[0]):
+        return await download_batch(message, urls)
 
-    # Send a message indicating that the download is in progress
-    downloading_sent = await message.reply("Downloading ...", disable_web_page_preview=True)
+    url = urls[0]
 
-    # Download the audio file and get the file location, thumbnail location, caption, and metadata
-    try:
-        audio_data = await download_service.download(url=message.text)
-    except Exception as e:
-        logger.error(f"An error occurred while downloading audio: {e}")
-        await downloading_sent.edit_text(
-            text=f"An error occured"
-        )
+    # Resend the audio by file_id if it has already been uploaded
+    video_id = get_video_id(url)
+    if video_id and await resend_cached_audio(message, video_id):
         return None
 
-    file_location, thumbnail_location, file_caption, data = audio_data.file_path, audio_data.thumbnail_path, audio_data.title, {"artist": audio_data.artist, "title": audio_data.title}
+    await submit_job(message, url=url, video_id=video_id, kind='single')
+    return None
+
+
+async def download_batch(message: types.Message, urls: list[str]) -> None:
+    await submit_job(message, url=urls[0], urls=urls, kind='batch')
+    return None
 
-    # After downloading is done, update the message to indicate that the download is complete
-    await downloading_sent.edit_text(
-        text=f"<b>🎵 {data['title']}</b>\n\nDownloading - DONE\nUploading ...",
-    )
 
-    # Upload the file to Telegram according to its size
+async def submit_job(message: types.Message, kind: str, **job_data) -> None:
+    """
+    Create a job for the message and put it into the job queue for the workers.
+    """
+
+    # Check whether the job can be accepted before replying
     try:
-        if os.path.getsize(file_location) > 52428800:
-            await upload_big_file(file_location, thumbnail_location, data)
-        else:
-            await upload_to_telegram(message.bot, file_location, thumbnail_location, file_caption)
-    except Exception as e:
-        logger.error(f"An error occurred while uploading the file: {e}")
-        await downloading_sent.edit_text(
-            text=f"An error occurred",
-        )
+        position = await JobQueue.check_admission(message.from_user.id)
+    except UserLimitError:
+        await message.reply("You already have downloads in progress. Please wait until they are finished.")
         return None
+    except QueueFullError:
+        await message.reply("Too many downloads at the moment. Please try again later.")
+        return None
+
+    # Send a message indicating that the download is queued or in progress
+    status_text = f"Queued, you are #{position} in line ..." if position else "Downloading ..."
 
-    # After the upload is complete, send a message with the thumbnail and caption in the chat
-    await send_photo(
-        bot=message.bot,
+    # Show the title right away if the video has been seen before
+    metadata = await MetadataCacheService.get(job_data['video_id']) if job_data.get('video_id') else None
+    if metadata:
+        status_text = f"<b>🎵 {metadata.title}</b>\n\n{status_text}"
+
+    downloading_sent = await message.reply(status_text, disable_web_page_preview=True)
+
+    job = DownloadJob(
+        user_id=message.from_user.id,
         chat_id=message.chat.id,
-        photo_path=thumbnail_location,
-        caption=f"<b>🎵 {data['title']}</b>\n\nSuccessfully uploaded to the channel."
+        message_id=message.message_id,
+        status_message_id=downloading_sent.message_id,
+        **job_data,
     )
 
-    # Clean up the files after upload
-    os.remove(file_location)
-    os.remove(thumbnail_location)
+    # Hand the job over to the workers
+    try:
+        await JobQueue.enqueue(kind, job)
+    except Exception as e:
+        logger.error(f"An error occurred while queueing the job: {e}")
+        await downloading_sent.edit_text("An error occurred")
+
+    return None
 
-    # Delete the messages
-    await downloading_sent.delete()
-    await message.delete()
 
-    return None
\ No newline at end of file
+async def resend_cached_audio(message: types.Message, video_id: str) -> bool:
+    """
+    Resend a previously uploaded audio by its file_id.
+
+    :return: True if the cached audio was sent, False if it has to be downloaded.
+    """
+    try:
+        cached = await MediaCacheService.get(video_id)
+    except Exception as e:
+        logger.error(f"An error occurred while looking up the media cache: {e}")
+        return False
+
+    if not cached:
+        return False
+
+    try:
+        await MediaCacheService.send(message.bot, cached)
+    except Exception as e:
+        logger.warning(f"Failed to resend cached video {video_id}, downloading again: {e}")
+        await MediaCacheService.invalidate(video_id)
+        return False
+
+    caption = f"<b>🎵 {cached.title}</b>\n\nSuccessfully uploaded to the channel."
+    if cached.thumbnail_file_id:
+        await message.bot.send_photo(chat_id=message.chat.id, photo=cached.thumbnail_file_id, caption=caption)
+    else:
+        await message.answer(caption)
+
+    await message.delete()
+    return True
@@ -0,0 +1,48 @@
+import asyncio
+
+from config import settings
+from config.logging_conf import logger
+from core.cache import audio_cache
+from services.download.formats import get_output_format, get_output_bitrate
+
+
+class AudioCacheService:
+    """
+    Service for reusing finished, tagged audio files from the local disk cache,
+    keyed by video ID and the format they were produced in.
+    """
+
+    @staticmethod
+    def _get_key(video_id: str) -> str:
+        bitrate = get_output_bitrate()
+        return f"{video_id}:{get_output_format().codec}:{bitrate or 'native'}"
+
+    @classmethod
+    async def checkout(cls, video_id: str, save_path: str) -> bool:
+        """
+        Link the cached audio of the given video to the given path.
+
+        :return: True if the audio was cached.
+        """
+        if not settings.AUDIO_CACHE_SIZE_MB:
+            return False
+
+        try:
+            return await asyncio.to_thread(audio_cache.checkout, cls._get_key(video_id), save_path)
+        except Exception as e:
+            logger.error(f"Failed to read cached audio of video {video_id}: {e}")
+            return False
+
+    @classmethod
+    async def store(cls, video_id: str, file_path: str) -> None:
+        """
+        Add a copy of the finished audio file of the given video to the cache.
+        """
+        if not settings.AUDIO_CACHE_SIZE_MB:
+            return
+
+        try:
+            await asyncio.to_thread(audio_cache.add, cls._get_key(video_id), file_path)
+            logger.info(f"Cached audio of video {video_id}")
+        except Exception as e:
+            logger.error(f"Failed to cache audio of video {video_id}: {e}")
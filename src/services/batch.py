@@ -0,0 +1,134 @@
+import asyncio
+import time
+from collections import Counter
+
+from aiogram import Bot
+
+from config import settings
+from config.logging_conf import logger
+from core.metrics import record_error
+from core.scheduler import scheduler
+from core.scratch import scratch
+from db.models import Job
+from services.download.base import BaseDownloadService
+from services.download.formats import get_output_format
+from services.job_queue import JobQueue
+from services.media_cache import MediaCacheService
+from services.pipeline import DownloadPipeline
+from services.streaming import StreamingService
+from services.yt_dlp import DLPService
+from utils.dlp_utils import get_video_id, is_playlist_url
+
+# Minimum interval between two edits of the status message
+PROGRESS_INTERVAL = 3
+
+
+class BatchPipeline:
+    """
+    Runs a batch download job: every track behind the given URLs is uploaded to the channel,
+    with the progress of the whole batch shown in a single status message.
+
+    An interrupted batch starts over, the tracks it already uploaded are then found in the media cache.
+    """
+
+    @classmethod
+    async def run(cls, bot: Bot, record: Job) -> None:
+        job = record.job
+        download_service = DLPService()
+
+        await DownloadPipeline.edit_status(bot, job, "Collecting tracks ...")
+
+        try:
+            urls = await cls.collect_urls(download_service, job.urls)
+        except Exception as e:
+            logger.error(f"An error occurred while collecting the tracks: {e}")
+            await DownloadPipeline.edit_status(bot, job, "An error occured")
+            raise
+        await JobQueue.checkpoint(record, 'extracted')
+
+        progress = Counter()
+        last_report = 0.0
+        semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+
+        async def process(url: str):
+            nonlocal last_report
+
+            async with semaphore:
+                try:
+                    progress[await cls.process_track(bot, download_service, url)] += 1
+                except Exception as e:
+                    logger.error(f"An error occurred while processing {url}: {e}")
+                    record_error(e)
+                    progress['failed'] += 1
+
+            # Throttle the edits, Telegram limits how often a message can be edited
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                last_report = time.monotonic()
+                await DownloadPipeline.edit_status(bot, job, cls._format_progress(progress, len(urls)))
+
+        await asyncio.gather(*(process(url) for url in urls))
+
+        await DownloadPipeline.edit_status(bot, job, cls._format_progress(progress, len(urls), done=True))
+        await JobQueue.checkpoint(record, 'notified')
+        return None
+
+    @classmethod
+    async def collect_urls(cls, download_service: BaseDownloadService, urls: list[str]) -> list[str]:
+        """
+        Expand playlists into the URLs of their tracks.
+        """
+        track_urls = []
+        for url in urls:
+            if is_playlist_url(url):
+                async with scheduler.pool('extract'):
+                    track_urls.extend(await download_service.list_entries(url))
+            else:
+                track_urls.append(url)
+
+        # Drop duplicates and cap the size of the batch
+        return list(dict.fromkeys(track_urls))[:settings.MAX_BATCH_SIZE]
+
+    @classmethod
+    async def process_track(cls, bot: Bot, download_service: BaseDownloadService, url: str) -> str:
+        """
+        Download and upload a single track of the batch.
+
+        :return: "uploaded", or "skipped" if the track is already in the channel.
+        """
+        video_id = get_video_id(url)
+        if video_id and await MediaCacheService.get(video_id):
+            return "skipped"
+
+        audio_message, audio_message_id = None, None
+
+        async with scratch.job() as directory:
+            if settings.STREAMING_UPLOADS and get_output_format().codec == 'mp3':
+                audio_data, source_url, headers = await download_service.prepare_stream(url=url, directory=directory)
+                async with scheduler.pool('transcode'), scheduler.pool('upload'):
+                    audio_message_id = await StreamingService.upload(audio_data, source_url, headers)
+            else:
+                audio_data = await download_service.download(url=url, directory=directory)
+                audio_message, audio_message_id = await DownloadPipeline.upload(bot, audio_data)
+
+        if video_id:
+            await MediaCacheService.store(
+                video_id=video_id,
+                title=audio_data.title,
+                artist=audio_data.artist,
+                audio_message=audio_message,
+                message_id=audio_message_id,
+            )
+
+        return "uploaded"
+
+    @staticmethod
+    def _format_progress(progress: Counter, total: int, done: bool = False) -> str:
+        processed = sum(progress.values())
+        header = "Batch download - DONE" if done else f"Batch download: {processed}/{total}"
+
+        return (
+            f"<b>🎵 {header}</b>\n\n"
+            f"Uploaded: {progress['uploaded']}\n"
+            f"Already in the channel: {progress['skipped']}\n"
+            f"Failed: {progress['failed']}"
+        )
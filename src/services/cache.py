@@ -0,0 +1,198 @@
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from hashlib import sha256
+
+from config.logging_conf import logger
+
+
+class DiskLRUCache:
+    """
+    Content-addressed file cache with a byte budget and LRU eviction.
+
+    Files are stored under the SHA-256 of their key. New entries are written to a
+    temporary file and published with an atomic rename, and readers get a hard link
+    of the entry, so evicting it never breaks a file that is still in use.
+    The index is locked, so the cache can be used from worker threads.
+
+    The index is saved to the cache directory in LRU order whenever an entry is published,
+    so loading it does not have to stat every cached file.
+    """
+
+    TEMP_PREFIX = '.tmp-'
+    INDEX_NAME = '.index.json'
+
+    def __init__(self, directory: str, max_bytes: int, suffix: str = ''):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self._index: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        self._lock = threading.RLock()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def load(self) -> None:
+        """
+        Build the index from the saved one and the files in the cache directory, least recently used first.
+        Only the files missing from the saved index are stat'ed, they are ordered by modification time.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+
+        saved_index = self._read_index()
+        indexed = set()
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or entry.name == self.INDEX_NAME:
+                continue
+            if entry.name.startswith(self.TEMP_PREFIX):
+                # Left over by an interrupted write
+                os.remove(entry.path)
+                continue
+            if entry.name in saved_index:
+                indexed.add(entry.name)
+                continue
+            # Published after the index was last saved
+            stat = entry.stat()
+            entries.append((stat.st_mtime, entry.name, stat.st_size))
+
+        with self._lock:
+            self._index.clear()
+            self._size = 0
+            for name, size in saved_index.items():
+                if name in indexed:
+                    self._index[name] = size
+                    self._size += size
+            for _, name, size in sorted(entries):
+                self._index[name] = size
+                self._size += size
+
+            self._evict()
+        logger.info(f"Loaded {len(self._index)} entries ({self._size} bytes) from {self.directory}")
+
+    def get(self, key: str) -> str | None:
+        """
+        Get the path of the cached file, or None if the key is not cached.
+        """
+        name = self._get_name(key)
+        with self._lock:
+            if name not in self._index or not os.path.exists(self._get_path(name)):
+                self._index.pop(name, None)
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._index.move_to_end(name)
+            return self._get_path(name)
+
+    def checkout(self, key: str, dest_path: str) -> bool:
+        """
+        Link the cached file to the given path.
+
+        :return: True if the key was cached.
+        """
+        path = self.get(key)
+        if path is None:
+            return False
+
+        try:
+            os.link(path, dest_path)
+        except FileExistsError:
+            os.remove(dest_path)
+            os.link(path, dest_path)
+        except FileNotFoundError:
+            # Evicted in the meantime
+            return False
+        except OSError:
+            # Different file systems, fall back to a copy
+            shutil.copyfile(path, dest_path)
+
+        return True
+
+    def get_temp_path(self) -> str:
+        """
+        Get a path in the cache directory to write a new entry to before publishing it.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"{self.TEMP_PREFIX}{uuid.uuid4().hex}")
+
+    def publish(self, key: str, temp_path: str) -> str:
+        """
+        Atomically move the file written to `temp_path` into the cache under the given key.
+
+        :return: The path of the cached file.
+        """
+        name = self._get_name(key)
+        path = self._get_path(name)
+        size = os.path.getsize(temp_path)
+
+        with self._lock:
+            os.replace(temp_path, path)
+
+            self._size += size - self._index.get(name, 0)
+            self._index[name] = size
+            self._index.move_to_end(name)
+            self._evict()
+            self.save_index()
+
+        return path
+
+    def add(self, key: str, file_path: str) -> str:
+        """
+        Add a copy of an existing file to the cache.
+
+        :return: The path of the cached file.
+        """
+        temp_path = self.get_temp_path()
+        try:
+            os.link(file_path, temp_path)
+        except OSError:
+            shutil.copyfile(file_path, temp_path)
+        return self.publish(key, temp_path)
+
+    def save_index(self) -> None:
+        """
+        Save the index, so the order of the entries survives a restart.
+        """
+        temp_path = self.get_temp_path()
+        try:
+            with self._lock:
+                with open(temp_path, 'w') as f:
+                    json.dump(list(self._index.items()), f)
+                os.replace(temp_path, os.path.join(self.directory, self.INDEX_NAME))
+        except OSError as e:
+            logger.warning(f"Failed to save the index of {self.directory}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _read_index(self) -> dict[str, int]:
+        try:
+            with open(os.path.join(self.directory, self.INDEX_NAME)) as f:
+                return dict(json.load(f))
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Ignoring the unreadable index of {self.directory}: {e}")
+            return {}
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and self._index:
+            name, size = self._index.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(self._get_path(name))
+            except FileNotFoundError:
+                pass
+
+    def _get_name(self, key: str) -> str:
+        return sha256(key.encode()).hexdigest() + self.suffix
+
+    def _get_path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
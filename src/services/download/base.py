@@ -1,16 +1,29 @@
 import asyncio
+import io
 import os
 import uuid
 from abc import abstractmethod, ABC
-from typing import final
+from contextlib import nullcontext
+from typing import Awaitable, Callable, final
 
-from aiogram.client.session import aiohttp
-from mutagen.id3 import TIT2, TPE1, APIC
-from mutagen.mp3 import MP3
+from mutagen.id3 import ID3, TIT2, TPE1, APIC, Frame
 
 from config.logging_conf import logger
+from core.cache import thumbnail_cache
+from core.metrics import stage_seconds
+from core.scheduler import scheduler
+from core.scratch import scratch
+from config import settings
 from core.templates import AudioData, AudioMetadata
-from utils.dlp_utils import valid_filename
+from services.audio_cache import AudioCacheService
+from services.download.formats import get_output_format
+from services.http import HTTPClient
+from services.metadata_cache import MetadataCacheService
+from utils.dlp_utils import get_video_id, valid_filename
+from utils.image_utils import normalize_thumbnail
+
+# Room left in ID3 tags, so they can be edited later without rewriting the audio after them
+ID3_PADDING = 64 * 1024
 
 
 class BaseDownloadService(ABC):
@@ -20,177 +33,394 @@ class BaseDownloadService(ABC):
 
     @classmethod
     @final
-    async def download(cls, url: str, *args, **kwargs) -> AudioData:
+    async def download(
+            cls,
+            url: str,
+            directory: str,
+            *args,
+            on_stage: Callable[[str, AudioData | None], Awaitable] | None = None,
+            **kwargs
+    ) -> AudioData:
         """
         Download audio from the given URL.
 
         :param url: The URL of the audio.
+        :param directory: The scratch directory of the job the files are saved to.
+        :param on_stage: Called with the name of each completed stage, "extracted", "downloaded" and "tagged",
+            and the audio data once the source is downloaded.
         :return: The path to the downloaded audio file.
         """
-
-        # Generate save paths for audio and thumbnail
-        audio_file_path = cls._get_audio_file_path()
-        thumbnail_file_path = cls._get_thumbnail_file_path()
+        video_id = get_video_id(url)
+
+        # Reuse the finished file of an earlier download of the same video
+        audio_data = await cls._get_cached_audio(video_id, directory) if video_id else None
+        if audio_data is not None:
+            if on_stage:
+                await on_stage('tagged', audio_data)
+            return audio_data
+
+        # Generate save paths for the source audio and thumbnail, the extension of the source is added on download
+        source_file_path = os.path.join(directory, f"{uuid.uuid4().hex}_source")
+        thumbnail_file_path = cls._get_thumbnail_file_path(directory)
+
+        # Extract the info once and reuse it for both metadata and download
+        async with scheduler.pool('extract'):
+            with stage_seconds.time(stage='extract'):
+                info = await cls.extract_info(url=url)
+
+        # Retrieve audio details and cache them for status messages of later requests
+        audio_details: AudioMetadata = await cls.get_audio_details(info=info)
+        await cls._cache_audio_details(info, audio_details)
+        if on_stage:
+            await on_stage('extracted', None)
+
+        # The source and the encoded file are both in the directory until the source is removed
+        if audio_details.filesize:
+            scratch.reserve(directory, 2 * audio_details.filesize)
 
         # Initiate the audio download task
-        audio_download_task = asyncio.create_task(
-            cls.download_audio(url=url, save_path=audio_file_path)
-        )
-
-        # Retrieve audio details
-        audio_details: AudioMetadata = await cls.get_audio_details(url=url)
-
-        # Generate new file_path for audio
-        new_audio_file_path = cls._get_audio_file_path(filename=audio_details.title)
+        audio_download_task = asyncio.create_task(cls._download_source(info=info, save_path=source_file_path))
 
         # Download the thumbnail if it exists
-        await cls.download_thumbnail(thumbnail_url=audio_details.thumbnail_url, save_path=thumbnail_file_path)
+        try:
+            with stage_seconds.time(stage='thumbnail'):
+                await cls.download_thumbnail(thumbnail_url=audio_details.thumbnail_url, save_path=thumbnail_file_path)
+        except Exception:
+            audio_download_task.cancel()
+            raise
 
         # Wait for the audio download to complete
-        await audio_download_task
+        source_file_path = await audio_download_task
 
-        # Rename the audio file to include the title
-        os.rename(audio_file_path, new_audio_file_path)
-
-        # Create AudioData instance with the downloaded audio and metadata
-        audio_data = AudioData(file_path=new_audio_file_path,
+        # Create AudioData instance with the final audio path, named after the title, and metadata
+        audio_data = AudioData(file_path=cls._get_audio_file_path(directory, filename=audio_details.title),
+                               source_path=source_file_path,
                                thumbnail_path=thumbnail_file_path,
+                               mime_type=get_output_format().mime_type,
                                **audio_details.model_dump())
+        if on_stage:
+            await on_stage('downloaded', audio_data)
+
+        return await cls.encode(audio_data, video_id=video_id, on_stage=on_stage)
+
+    @classmethod
+    @final
+    async def encode(
+            cls,
+            audio_data: AudioData,
+            video_id: str | None = None,
+            on_stage: Callable[[str, AudioData | None], Awaitable] | None = None,
+    ) -> AudioData:
+        """
+        Encode the downloaded source with its metadata and cover art in a single pass, then remove the source.
+        Jobs interrupted after the download resume here.
+
+        :param audio_data: The audio data with the path of the source.
+        :param video_id: The ID of the video the finished file is cached under, if any.
+        :param on_stage: Called with "tagged" and the audio data once the file is written.
+        :return: The audio data of the finished file.
+        """
+        async with scheduler.pool('transcode'):
+            await cls.encode_audio(source_path=audio_data.source_path, audio_data=audio_data)
+
+        # The source is left in the job directory if the job is cancelled, so it can be resumed
+        os.remove(audio_data.source_path)
+        audio_data.source_path = None
+        if on_stage:
+            await on_stage('tagged', audio_data)
 
-        # Process the audio file to add metadata and cover art
-        await cls.process_audio(audio_data=audio_data)
+        if video_id:
+            await AudioCacheService.store(video_id=video_id, file_path=audio_data.file_path)
 
         return audio_data
 
+    @classmethod
+    async def _download_source(cls, info: dict, save_path: str) -> str:
+        async with scheduler.pool('download'):
+            return await cls.download_audio(info=info, save_path=save_path)
+
+    @classmethod
+    async def _get_cached_audio(cls, video_id: str, directory: str) -> AudioData | None:
+        """
+        Get the audio of the given video from the audio cache, with its cached metadata and thumbnail.
+
+        :return: The audio data, or None if either the audio or its metadata is not cached.
+        """
+        audio_file_path = cls._get_audio_file_path(directory)
+        if not await AudioCacheService.checkout(video_id=video_id, save_path=audio_file_path):
+            return None
+
+        audio_details = await MetadataCacheService.get(video_id)
+        if audio_details is None:
+            os.remove(audio_file_path)
+            return None
+
+        logger.info(f"Audio of video {video_id} served from cache")
+
+        new_audio_file_path = cls._get_audio_file_path(directory, filename=audio_details.title)
+        os.rename(audio_file_path, new_audio_file_path)
+
+        thumbnail_file_path = cls._get_thumbnail_file_path(directory)
+        with stage_seconds.time(stage='thumbnail'):
+            await cls.download_thumbnail(thumbnail_url=audio_details.thumbnail_url, save_path=thumbnail_file_path)
+
+        return AudioData(file_path=new_audio_file_path,
+                         thumbnail_path=thumbnail_file_path,
+                         mime_type=get_output_format().mime_type,
+                         **audio_details.model_dump())
+
     @classmethod
     @final
-    def _get_audio_file_path(cls, filename: str = None) -> str:
+    async def prepare_stream(cls, url: str, directory: str) -> tuple[AudioData, str, dict[str, str]]:
+        """
+        Prepare the audio of the given URL for streaming instead of downloading it.
 
-        if not filename:
-            filename = valid_filename(str(uuid.uuid4().hex))
+        :param url: The URL of the audio.
+        :param directory: The scratch directory of the job the thumbnail is saved to.
+        :return: AudioData without a file path, the direct URL of the audio stream and its HTTP headers.
+        """
+        thumbnail_file_path = cls._get_thumbnail_file_path(directory)
+
+        # Extract the info once and reuse it for both metadata and the stream source
+        async with scheduler.pool('extract'):
+            with stage_seconds.time(stage='extract'):
+                info = await cls.extract_info(url=url)
+                source_url, headers = await cls.get_stream_source(info=info)
+
+        audio_details: AudioMetadata = await cls.get_audio_details(info=info)
+        await cls._cache_audio_details(info, audio_details)
 
-        download_dir = os.getcwd() + "/tmp"
-        file_path = f"{download_dir}/{filename}.mp3"
+        # The thumbnail is small, so it is still downloaded to disk
+        with stage_seconds.time(stage='thumbnail'):
+            await cls.download_thumbnail(thumbnail_url=audio_details.thumbnail_url, save_path=thumbnail_file_path)
 
-        if not os.path.exists(download_dir):
-            os.makedirs(download_dir)
+        audio_data = AudioData(thumbnail_path=thumbnail_file_path,
+                               mime_type=get_output_format().mime_type,
+                               **audio_details.model_dump())
+
+        return audio_data, source_url, headers
 
-        return file_path
+    @classmethod
+    async def get_stream_source(cls, info: dict) -> tuple[str, dict[str, str]]:
+        """
+        Resolve the direct URL and HTTP headers of the audio stream described by the extracted info.
+
+        :param info: The info returned by `extract_info`.
+        :return: The URL of the audio stream and the headers required to fetch it.
+        """
+        raise NotImplementedError(f"{cls.__name__} does not support streaming.")
+
+    @staticmethod
+    async def _cache_audio_details(info: dict, audio_details: AudioMetadata) -> None:
+        if info.get('id'):
+            await MetadataCacheService.store(video_id=info['id'], metadata=audio_details)
 
     @classmethod
     @final
-    def _get_thumbnail_file_path(cls) -> str:
-        filename = valid_filename(str(uuid.uuid4().hex))
-        download_dir = os.getcwd() + "/tmp"
-        file_path = f"{download_dir}/{filename}_thumbnail.jpg"
+    def _get_audio_file_path(cls, directory: str, filename: str = None) -> str:
 
-        if not os.path.exists(download_dir):
-            os.makedirs(download_dir)
+        if not filename:
+            filename = valid_filename(str(uuid.uuid4().hex))
 
-        return file_path
+        return f"{directory}/{filename}.{get_output_format().extension}"
+
+    @classmethod
+    @final
+    def _get_thumbnail_file_path(cls, directory: str) -> str:
+        filename = valid_filename(str(uuid.uuid4().hex))
+        return f"{directory}/{filename}_thumbnail.jpg"
 
     @classmethod
     @abstractmethod
-    async def get_audio_details(cls, url: str) -> AudioMetadata:
+    async def extract_info(cls, url: str) -> dict:
         """
-        Download details from the given URL.
+        Extract the info of the given URL without downloading anything.
+
+        The returned info is passed to both `get_audio_details` and `download_audio`,
+        so the source is queried only once per download.
 
         :param url: The URL of the audio.
-        :return: AudioData containing metadata and thumbnail URL.
+        :return: The extracted info.
+        """
+        pass
+
+    @classmethod
+    async def list_entries(cls, url: str) -> list[str]:
+        """
+        List the URLs of the tracks behind the given URL, e.g. the entries of a playlist.
+
+        :param url: The URL of a track or a collection of tracks.
+        :return: The URLs of the tracks.
+        """
+        return [url]
+
+    @classmethod
+    @abstractmethod
+    async def get_audio_details(cls, info: dict) -> AudioMetadata:
+        """
+        Retrieve audio details from the extracted info.
+
+        :param info: The info returned by `extract_info`.
+        :return: AudioMetadata containing metadata and thumbnail URL.
         """
         pass
 
     @classmethod
     @abstractmethod
-    async def download_audio(cls, url: str, save_path: str) -> None:
+    async def download_audio(cls, info: dict, save_path: str) -> str:
         """
-        Download the audio file from the given URL and save it to the specified path.
+        Download the audio described by the extracted info as it is served by the source, without converting it.
 
-        :param url: The URL of the audio.
-        :param save_path: The path where the audio file will be saved.
-        :return: AudioData containing the audio file and metadata.
+        :param info: The info returned by `extract_info`.
+        :param save_path: The path where the audio file will be saved, without extension.
+        :return: The path of the downloaded file, with the extension of the source format.
         """
         pass
 
+    @classmethod
+    @final
+    async def encode_audio(cls, source_path: str, audio_data: AudioData) -> None:
+        """
+        Convert the downloaded source to the output format, writing metadata and cover art in the same pass.
+
+        The ID3 tag of MP3 files is written first, with ID3_PADDING bytes to spare, and FFmpeg
+        appends the audio frames after it. Other formats are tagged by FFmpeg itself.
+        """
+        logger.info("Encoding audio ...")
+
+        is_mp3 = get_output_format().codec == 'mp3'
+        with open(audio_data.file_path, 'wb') if is_mp3 else nullcontext() as output:
+            if output:
+                output.write(await asyncio.to_thread(cls._get_id3_header, audio_data))
+                output.flush()
+
+            with stage_seconds.time(stage='transcode'):
+                process = await asyncio.create_subprocess_exec(
+                    *cls._get_encode_command(source_path, audio_data),
+                    stdin=asyncio.subprocess.DEVNULL,
+                    # MP3 frames are written by FFmpeg straight after the tag, to the same file
+                    stdout=output or asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                try:
+                    _, stderr = await process.communicate()
+                finally:
+                    if process.returncode is None:
+                        process.kill()
+                        await process.wait()
+
+        if process.returncode != 0:
+            raise RuntimeError(f"FFmpeg failed: {stderr.decode(errors='replace').strip()}")
+
+        logger.info(f"Audio encoded successfully to {audio_data.file_path}")
+
+    @classmethod
+    def _get_encode_command(cls, source_path: str, audio_data: AudioData) -> list[str]:
+        """
+        Get the FFmpeg command converting the source to the output format.
+        MP3 is written to stdout without tags, other formats to the audio path with tags and cover art.
+        """
+        output_format = get_output_format()
+
+        # Streams already in the output format are copied without re-encoding
+        if os.path.splitext(source_path)[1] == f'.{output_format.extension}':
+            codec_args = ['-c:a', 'copy']
+        else:
+            encoder = 'libmp3lame' if output_format.codec == 'mp3' else 'aac'
+            codec_args = ['-c:a', encoder, '-b:a', f'{settings.AUDIO_BITRATE}k']
+
+        command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', source_path]
+
+        if output_format.codec == 'mp3':
+            return [
+                *command, '-map', '0:a:0', *codec_args,
+                # The tag is already written, and the Xing header cannot be updated on a pipe
+                '-id3v2_version', '0', '-write_xing', '0',
+                '-f', 'mp3', 'pipe:1',
+            ]
+
+        cover_args = []
+        if audio_data.thumbnail_path and os.path.exists(audio_data.thumbnail_path):
+            command += ['-i', audio_data.thumbnail_path]
+            cover_args = ['-map', '1:v:0', '-c:v', 'copy', '-disposition:v:0', 'attached_pic']
+
+        return [
+            *command, '-map', '0:a:0', *codec_args, *cover_args,
+            '-metadata', f'title={audio_data.title}',
+            '-metadata', f'artist={audio_data.artist}',
+            '-f', 'ipod', '-y', audio_data.file_path,
+        ]
+
     @classmethod
     @final
     async def download_thumbnail(cls, thumbnail_url: str, save_path: str) -> None:
         """
-        Download the thumbnail image from the given URL using async HTTP client.
+        Download the thumbnail image from the given URL using the shared HTTP client.
+        The image is normalized to a Telegram-sized JPEG once, and cached on disk by URL,
+        so repeat requests skip both the fetch and the normalization.
         """
+        if thumbnail_cache.checkout(thumbnail_url, save_path):
+            logger.info(f"Thumbnail served from cache to {save_path}")
+            return
+
         logger.info("Downloading thumbnail ...")
 
+        temp_path = thumbnail_cache.get_temp_path()
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(thumbnail_url, allow_redirects=True) as response:
-                    response.raise_for_status()
-                    content = await response.read()
-
-                    # Write file in thread pool to avoid blocking
-                    await asyncio.to_thread(
-                        cls._write_file,
-                        save_path,
-                        content
-                    )
+            session = HTTPClient.get_session()
+            async with session.get(thumbnail_url, allow_redirects=True) as response:
+                response.raise_for_status()
+
+                # Stream the body to disk instead of buffering it
+                with open(temp_path, 'wb') as f:
+                    async for chunk in response.content.iter_chunked(64 * 1024):
+                        # Write file in thread pool to avoid blocking
+                        await asyncio.to_thread(f.write, chunk)
+
+            # Resize the image in thread pool to avoid blocking
+            await asyncio.to_thread(normalize_thumbnail, temp_path, save_path)
+
+            # The image is written to the job first, so it is there even if the cache evicts it right away
+            await asyncio.to_thread(thumbnail_cache.add, thumbnail_url, save_path)
         except Exception as e:
             logger.error(f"Failed to download thumbnail: {str(e)}")
             raise
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
         logger.info(f"Thumbnail successfully downloaded to {save_path}")
 
-
     @classmethod
-    @final
-    async def process_audio(cls, audio_data: AudioData) -> None:
-        """
-        Add metadata and cover art to audio file without re-encoding.
-        Uses mutagen for direct ID3 tag manipulation.
-        """
-        logger.info("Adding metadata to audio file ...")
-
-        file_path = audio_data.file_path
-        title = audio_data.title
-        artist = audio_data.artist
-        thumbnail_path = audio_data.thumbnail_path
-
-        def add_metadata():
-            try:
-                # Load the MP3 file
-                audio_file = MP3(file_path)
-
-                # Create ID3 tags if they don't exist
-                if audio_file.tags is None:
-                    audio_file.add_tags()
-
-                # Add basic metadata
-                audio_file.tags.add(TIT2(encoding=3, text=title))  # Title
-                audio_file.tags.add(TPE1(encoding=3, text=artist))  # Artist
-
-                # Add cover art if thumbnail exists
-                if os.path.exists(thumbnail_path):
-                    with open(thumbnail_path, 'rb') as albumart:
-                        audio_file.tags.add(
-                            APIC(
-                                encoding=3,                # UTF-8
-                                mime='image/jpeg',         # MIME type
-                                type=3,                    # Cover (front)
-                                desc='Cover',
-                                data=albumart.read()
-                            )
-                        )
-
-                # Save the changes
-                audio_file.save()
-                logger.info(f"Metadata added successfully to {file_path}")
-
-            except Exception as e:
-                logger.error(f"Failed to add metadata: {str(e)}")
-                raise
-
-        # Run in thread pool to avoid blocking
-        await asyncio.to_thread(add_metadata)
+    def _get_id3_header(cls, audio_data: AudioData) -> bytes:
+        """
+        Build the ID3 tag written at the start of a new MP3 file.
+        """
+        tags = ID3()
+        for frame in cls._get_id3_frames(audio_data):
+            tags.add(frame)
+
+        buffer = io.BytesIO()
+        tags.save(buffer, padding=lambda info: ID3_PADDING)
+        return buffer.getvalue()
 
     @staticmethod
-    def _write_file(file_path: str, content: bytes) -> None:
-        """Helper method to write file content."""
-        with open(file_path, 'wb') as f:
-            f.write(content)
+    def _get_id3_frames(audio_data: AudioData) -> list[Frame]:
+        frames = [
+            TIT2(encoding=3, text=audio_data.title),  # Title
+            TPE1(encoding=3, text=audio_data.artist),  # Artist
+        ]
+
+        # Add cover art if thumbnail exists
+        if audio_data.thumbnail_path and os.path.exists(audio_data.thumbnail_path):
+            with open(audio_data.thumbnail_path, 'rb') as albumart:
+                frames.append(
+                    APIC(
+                        encoding=3,                # UTF-8
+                        mime='image/jpeg',         # MIME type
+                        type=3,                    # Cover (front)
+                        desc='Cover',
+                        data=albumart.read()
+                    )
+                )
+
+        return frames
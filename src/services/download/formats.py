@@ -0,0 +1,39 @@
+from config import settings
+from core.templates import AudioFormat
+
+
+AUDIO_FORMATS = {
+    'mp3': AudioFormat(codec='mp3', extension='mp3', mime_type='audio/mpeg'),
+    'm4a': AudioFormat(codec='m4a', extension='m4a', mime_type='audio/mp4'),
+}
+
+# Prefer AAC streams in native mode, so they can be remuxed into m4a without re-encoding
+NATIVE_FORMAT_SELECTOR = 'bestaudio[ext=m4a]/bestaudio[acodec^=mp4a]/bestaudio/best'
+TRANSCODE_FORMAT_SELECTOR = 'bestaudio/best'
+
+
+def is_native_mode() -> bool:
+    return settings.AUDIO_MODE == 'native'
+
+
+def get_output_format() -> AudioFormat:
+    """
+    Get the format of the produced audio files.
+    """
+    codec = 'm4a' if is_native_mode() else settings.AUDIO_CODEC
+
+    if codec not in AUDIO_FORMATS:
+        raise ValueError(f"Unsupported audio codec: {codec}")
+
+    return AUDIO_FORMATS[codec]
+
+
+def get_output_bitrate() -> int | None:
+    """
+    Get the bitrate of the produced audio files, None if the source bitrate is kept.
+    """
+    return None if is_native_mode() else settings.AUDIO_BITRATE
+
+
+def get_format_selector() -> str:
+    return NATIVE_FORMAT_SELECTOR if is_native_mode() else TRANSCODE_FORMAT_SELECTOR
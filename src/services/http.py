@@ -0,0 +1,37 @@
+import aiohttp
+
+from config import settings
+
+
+class HTTPClient:
+    """
+    Process-wide HTTP client with keep-alive connection pooling and DNS caching.
+    """
+    session: aiohttp.ClientSession | None = None
+
+    @classmethod
+    def get_session(cls) -> aiohttp.ClientSession:
+        """
+        Get the shared session, creating it on first use.
+        """
+        if cls.session is None or cls.session.closed:
+            cls.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=settings.HTTP_POOL_SIZE,
+                    ttl_dns_cache=300,
+                    keepalive_timeout=60,
+                ),
+                timeout=aiohttp.ClientTimeout(
+                    total=settings.HTTP_TIMEOUT,
+                    sock_connect=10,
+                ),
+            )
+        return cls.session
+
+    @classmethod
+    async def close(cls) -> None:
+        """
+        Close the shared session.
+        """
+        if cls.session is not None and not cls.session.closed:
+            await cls.session.close()
@@ -0,0 +1,229 @@
+import asyncio
+import datetime
+
+from pymongo import ReturnDocument
+
+from config import settings
+from core.templates import AudioData, DownloadJob
+from core.utils import get_current_time
+from db.models import Job
+from services.scheduler import QueueFullError, UserLimitError
+
+# Stages of a job in the order they are completed
+STAGES = ('extracted', 'downloaded', 'tagged', 'uploaded', 'notified')
+
+
+class JobQueue:
+    """
+    Job queue shared by the dispatcher and the workers through MongoDB.
+
+    The dispatcher puts jobs into the `jobs` collection and any worker, in this process
+    or another one, claims them in the order they were queued.
+
+    A claimed job is leased to its worker, which renews the lease while the job runs and
+    records each completed stage. When a worker dies, its jobs are claimed again once their
+    lease expires, and resume after the last completed stage.
+    """
+    # Set when a job is queued by this process, so a local worker does not wait for the next poll
+    _wakeup: asyncio.Event | None = None
+
+    @classmethod
+    async def check_admission(cls, user_id: int) -> int:
+        """
+        Check whether a job of the given user would be accepted.
+
+        :return: The position the job would have in line, 0 if no job is waiting before it.
+        :raises UserLimitError: If the user has too many jobs in flight.
+        :raises QueueFullError: If the queue is full.
+        """
+        in_flight = await Job.collection.count_documents(
+            {'job.user_id': user_id, 'status': {'$in': ['queued', 'running']}},
+            limit=settings.MAX_JOBS_PER_USER,
+        )
+        if in_flight >= settings.MAX_JOBS_PER_USER:
+            raise UserLimitError(f"User {user_id} already has {settings.MAX_JOBS_PER_USER} jobs in flight.")
+
+        queued = await Job.collection.count_documents({'status': 'queued'}, limit=settings.MAX_QUEUE_SIZE)
+        if queued >= settings.MAX_QUEUE_SIZE:
+            raise QueueFullError("The job queue is full.")
+
+        return queued + 1 if queued else 0
+
+    @classmethod
+    async def enqueue(cls, kind: str, job: DownloadJob) -> Job:
+        """
+        Put the job into the queue.
+
+        :param kind: 'single' or 'batch'.
+        :param job: The job to run.
+        """
+        record = Job(kind=kind, job=job)
+        result = await Job.collection.insert_one(record.model_dump())
+        record.id = result.inserted_id
+
+        cls._get_wakeup().set()
+        return record
+
+    @classmethod
+    async def claim(cls, worker_id: str, exclude_users: list[int] | None = None) -> Job | None:
+        """
+        Take the oldest job that is queued or whose lease has expired, and lease it to the given worker.
+
+        :param exclude_users: IDs of the users whose jobs are left to other workers or later polls,
+            e.g. because the worker cannot run more jobs of theirs.
+        """
+        now = get_current_time()
+        query = {
+            '$or': [
+                {'status': 'queued'},
+                {'status': 'running', 'lease_expires_at': {'$lte': now}},
+            ],
+            'attempts': {'$lt': settings.JOB_MAX_ATTEMPTS},
+        }
+        if exclude_users:
+            query['job.user_id'] = {'$nin': exclude_users}
+
+        document = await Job.collection.find_one_and_update(
+            query,
+            {
+                '$set': {
+                    'status': 'running',
+                    'worker_id': worker_id,
+                    'lease_expires_at': cls._get_lease_expiry(now),
+                    'started_at': now,
+                    'updated_at': now,
+                },
+                '$inc': {'attempts': 1},
+            },
+            sort=[('created_at', 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        return Job.model_validate(document) if document else None
+
+    @classmethod
+    async def heartbeat(cls, job: Job) -> bool:
+        """
+        Renew the lease of a running job.
+
+        :return: False if the job is no longer leased to its worker.
+        """
+        now = get_current_time()
+        result = await Job.collection.update_one(
+            {'_id': job.id, 'status': 'running', 'worker_id': job.worker_id},
+            {'$set': {'lease_expires_at': cls._get_lease_expiry(now), 'updated_at': now}},
+        )
+        return result.matched_count > 0
+
+    @classmethod
+    async def checkpoint(
+            cls,
+            job: Job,
+            stage: str,
+            audio_data: AudioData | None = None,
+            audio_message_id: int | None = None
+    ) -> None:
+        """
+        Record that the job completed the given stage, along with what is needed to resume after it.
+        """
+        update = {'stage': stage, 'updated_at': get_current_time()}
+        if audio_data is not None:
+            update['audio_data'] = audio_data.model_dump()
+            job.audio_data = audio_data
+        if audio_message_id is not None:
+            update['audio_message_id'] = audio_message_id
+            job.audio_message_id = audio_message_id
+
+        # A job taken over by another worker is left to it
+        await Job.collection.update_one({'_id': job.id, 'worker_id': job.worker_id}, {'$set': update})
+        job.stage = stage
+
+    @staticmethod
+    def reached(job: Job, stage: str) -> bool:
+        """
+        Check whether the job has completed the given stage.
+        """
+        return job.stage is not None and STAGES.index(job.stage) >= STAGES.index(stage)
+
+    @classmethod
+    async def recover(cls, worker_id: str) -> int:
+        """
+        Expire the leases of the jobs left running by an earlier process with the same worker ID,
+        so they are resumed right away instead of after their lease.
+
+        :return: The number of recovered jobs.
+        """
+        result = await Job.collection.update_many(
+            {'status': 'running', 'worker_id': worker_id},
+            {'$set': {'lease_expires_at': get_current_time()}},
+        )
+        if result.modified_count:
+            cls._get_wakeup().set()
+        return result.modified_count
+
+    @classmethod
+    async def fail_abandoned(cls) -> list[Job]:
+        """
+        Mark the jobs whose lease expired after their last attempt as failed.
+
+        :return: The failed jobs.
+        """
+        now = get_current_time()
+        query = {
+            'status': 'running',
+            'lease_expires_at': {'$lte': now},
+            'attempts': {'$gte': settings.JOB_MAX_ATTEMPTS},
+        }
+        jobs = [Job.model_validate(document) async for document in Job.collection.find(query)]
+        if jobs:
+            await Job.collection.update_many(
+                {**query, '_id': {'$in': [job.id for job in jobs]}},
+                {'$set': {'status': 'failed', 'lease_expires_at': None, 'finished_at': now, 'updated_at': now}},
+            )
+        return jobs
+
+    @classmethod
+    async def release(cls, job: Job) -> None:
+        """
+        Put a claimed job back into the queue. It keeps its last completed stage and is resumed after it.
+        """
+        await Job.collection.update_one(
+            {'_id': job.id, 'worker_id': job.worker_id},
+            {
+                '$set': {'status': 'queued', 'worker_id': None, 'lease_expires_at': None, 'updated_at': get_current_time()},
+                '$inc': {'attempts': -1},
+            },
+        )
+        cls._get_wakeup().set()
+
+    @classmethod
+    async def finish(cls, job: Job, status: str) -> None:
+        """
+        Mark the job as finished with the given status, 'done' or 'failed'.
+        """
+        now = get_current_time()
+        await Job.collection.update_one(
+            {'_id': job.id, 'worker_id': job.worker_id},
+            {'$set': {'status': status, 'lease_expires_at': None, 'finished_at': now, 'updated_at': now}},
+        )
+
+    @classmethod
+    async def wait(cls, timeout: float) -> None:
+        """
+        Wait until a job is queued by this process or the timeout expires.
+        """
+        wakeup = cls._get_wakeup()
+        try:
+            await asyncio.wait_for(wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        wakeup.clear()
+
+    @staticmethod
+    def _get_lease_expiry(now: datetime.datetime) -> datetime.datetime:
+        return now + datetime.timedelta(seconds=settings.JOB_LEASE_SECONDS)
+
+    @classmethod
+    def _get_wakeup(cls) -> asyncio.Event:
+        if cls._wakeup is None:
+            cls._wakeup = asyncio.Event()
+        return cls._wakeup
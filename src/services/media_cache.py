@@ -0,0 +1,106 @@
+from aiogram import Bot
+from aiogram.types import Message
+
+from config import settings
+from config.logging_conf import logger
+from core.metrics import media_cache_requests
+from db.models import CachedMedia
+from services.download.formats import get_output_format, get_output_bitrate
+
+
+class MediaCacheService:
+    """
+    Service for reusing already uploaded audio by its Telegram file_id.
+    """
+
+    @staticmethod
+    def _get_criteria(video_id: str) -> dict:
+        return {
+            'video_id': video_id,
+            'audio_format': get_output_format().codec,
+            'bitrate': get_output_bitrate(),
+            'channel_id': settings.CHANNEL_ID,
+        }
+
+    @classmethod
+    async def get(cls, video_id: str) -> CachedMedia | None:
+        """
+        Retrieve the cached upload for the given video, if any.
+        """
+        cached = await CachedMedia.get(**cls._get_criteria(video_id))
+        media_cache_requests.inc(result='hit' if cached else 'miss')
+        return cached
+
+    @classmethod
+    async def store(
+            cls,
+            video_id: str,
+            title: str,
+            artist: str,
+            audio_message: Message | None = None,
+            message_id: int | None = None,
+            photo_message: Message | None = None,
+    ) -> CachedMedia | None:
+        """
+        Remember the uploaded audio so the next request can be served by file_id.
+
+        :param audio_message: The message returned by the Bot API upload.
+        :param message_id: The channel message ID returned by the MTProto upload.
+        :param photo_message: The message with the cover photo sent to the user.
+        """
+        data = {'title': title, 'artist': artist}
+
+        if audio_message and audio_message.audio:
+            data['file_id'] = audio_message.audio.file_id
+            data['file_unique_id'] = audio_message.audio.file_unique_id
+            data['message_id'] = audio_message.message_id
+        elif message_id:
+            data['message_id'] = message_id
+        else:
+            logger.warning(f"Nothing to cache for video {video_id}")
+            return None
+
+        if photo_message and photo_message.photo:
+            data['thumbnail_file_id'] = photo_message.photo[-1].file_id
+
+        criteria = cls._get_criteria(video_id)
+        cached = await CachedMedia.get_or_create(defaults=data, **criteria)
+
+        # Refresh the entry if it was created by an earlier upload
+        if cached and any(getattr(cached, key) != value for key, value in data.items()):
+            cached = await CachedMedia.update(criteria, data)
+
+        logger.info(f"Cached upload of video {video_id}")
+        return cached
+
+    @classmethod
+    async def send(cls, bot: Bot, cached: CachedMedia) -> None:
+        """
+        Resend the cached audio to the channel without downloading or uploading it again.
+        """
+        if cached.file_id:
+            await bot.send_audio(
+                chat_id=cached.channel_id,
+                audio=cached.file_id,
+                caption=f"🔉 <b>{cached.title}</b>",
+            )
+        elif cached.message_id:
+            await bot.copy_message(
+                chat_id=cached.channel_id,
+                from_chat_id=cached.channel_id,
+                message_id=cached.message_id,
+            )
+        else:
+            raise ValueError(f"Cached media {cached.video_id} has neither file_id nor message_id.")
+
+        logger.info(f"Resent cached video {cached.video_id}")
+
+    @classmethod
+    async def invalidate(cls, video_id: str) -> None:
+        """
+        Drop the cached upload for the given video.
+        """
+        try:
+            await CachedMedia.delete(**cls._get_criteria(video_id))
+        except ValueError:
+            pass
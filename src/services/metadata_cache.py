@@ -0,0 +1,58 @@
+import datetime
+
+from config import settings
+from config.logging_conf import logger
+from core.templates import AudioMetadata
+from core.utils import get_current_time
+from db.models import CachedMetadata
+from core.orm.cache import LRUCache
+
+
+class MetadataCacheService:
+    """
+    Two-tier cache of audio metadata keyed by video ID.
+
+    Lookups hit an in-process LRU first, and a MongoDB collection with a TTL index second.
+    """
+    memory = LRUCache(maxsize=settings.METADATA_CACHE_SIZE, ttl=settings.METADATA_CACHE_TTL)
+
+    @classmethod
+    async def get(cls, video_id: str) -> AudioMetadata | None:
+        """
+        Retrieve the cached metadata of the given video, if any.
+        """
+        metadata = cls.memory.get(video_id)
+        if metadata is not None:
+            return metadata
+
+        try:
+            cached = await CachedMetadata.get(video_id=video_id)
+        except Exception as e:
+            logger.error(f"Failed to look up metadata of video {video_id}: {e}")
+            return None
+
+        # The TTL monitor runs only once a minute, so expired documents may still be returned
+        if cached is None or cached.expires_at < get_current_time():
+            return None
+
+        metadata = AudioMetadata.model_validate(cached.model_dump(include=set(AudioMetadata.model_fields)))
+        cls.memory.set(video_id, metadata)
+        return metadata
+
+    @classmethod
+    async def store(cls, video_id: str, metadata: AudioMetadata) -> None:
+        """
+        Cache the metadata of the given video.
+        """
+        cls.memory.set(video_id, metadata)
+
+        data = {
+            **metadata.model_dump(),
+            'expires_at': get_current_time() + datetime.timedelta(seconds=settings.METADATA_CACHE_TTL),
+        }
+
+        try:
+            if await CachedMetadata.update({'video_id': video_id}, data) is None:
+                await CachedMetadata.create(video_id=video_id, **data)
+        except Exception as e:
+            logger.error(f"Failed to cache metadata of video {video_id}: {e}")
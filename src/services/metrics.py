@@ -0,0 +1,193 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, TypeVar
+
+# Upper bounds of the default histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+LabelValues = tuple[str, ...]
+
+
+class Metric:
+    """
+    Base class of the metrics, rendered in the Prometheus text exposition format.
+    """
+    type: str = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self.collect():
+            lines.append(f"{self.name}{suffix}{self._format_labels(labels)} {self._format_value(value)}")
+        return lines
+
+    def collect(self) -> list[tuple[str, dict[str, str], float]]:
+        """
+        :return: The samples of the metric, as name suffix, labels and value.
+        """
+        raise NotImplementedError
+
+    def _get_label_values(self, labels: dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _to_labels(self, values: LabelValues) -> dict[str, str]:
+        return dict(zip(self.labelnames, values))
+
+    @staticmethod
+    def _format_labels(labels: dict[str, str]) -> str:
+        if not labels:
+            return ''
+        pairs = ','.join(f'{name}="{Metric._escape(value)}"' for name, value in labels.items())
+        return '{' + pairs + '}'
+
+    @staticmethod
+    def _escape(value: str) -> str:
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    @staticmethod
+    def _format_value(value: float) -> str:
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(float(value))
+
+
+class ValueMetric(Metric):
+    """
+    Metric with a single value per label values.
+
+    The values are either updated explicitly, or read from `callback` on every scrape. The callback
+    returns the values by label values, or a single value for a metric without labels.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: tuple[str, ...] = (),
+            callback: Callable[[], float | dict[LabelValues, float]] | None = None
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+        self._callback = callback
+
+    def collect(self) -> list[tuple[str, dict[str, str], float]]:
+        if self._callback is not None:
+            values = self._callback()
+            if not isinstance(values, dict):
+                values = {(): values}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [('', self._to_labels(key), value) for key, value in values.items()]
+
+
+class Counter(ValueMetric):
+    """
+    Value that only goes up, e.g. the number of processed jobs. Its name should end with `_total`.
+    """
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._get_label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(ValueMetric):
+    """
+    Value that goes up and down, e.g. the queue depth.
+    """
+    type = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        key = self._get_label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values, e.g. the duration of a pipeline stage, in cumulative buckets.
+    """
+    type = 'histogram'
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: tuple[str, ...] = (),
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Bucket counts, sum and count by label values
+        self._values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._get_label_values(labels)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * len(self._buckets), [0.0]))
+            for index, bound in enumerate(self._buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe the time spent in the block, also when it raises.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def collect(self) -> list[tuple[str, dict[str, str], float]]:
+        samples = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                labels = self._to_labels(key)
+                cumulative = 0
+                for bound, count in zip(self._buckets, counts):
+                    cumulative += count
+                    le = '+Inf' if math.isinf(bound) else repr(float(bound))
+                    samples.append(('_bucket', {**labels, 'le': le}, cumulative))
+                samples.append(('_sum', labels, total[0]))
+                samples.append(('_count', labels, cumulative))
+        return samples
+
+
+M = TypeVar('M', bound=Metric)
+
+
+class MetricsRegistry:
+    """
+    Collection of the metrics of the process.
+    """
+
+    def __init__(self):
+        self._metrics: list[Metric] = []
+
+    def register(self, metric: M) -> M:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
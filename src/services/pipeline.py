@@ -0,0 +1,237 @@
+import os
+from functools import partial
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message
+
+from config import settings
+from config.logging_conf import logger
+from core.metrics import bytes_transferred, stage_seconds
+from core.scheduler import scheduler
+from core.scratch import scratch
+from core.templates import AudioData, DownloadJob
+from db.models import Job
+from services.download.formats import get_output_format
+from services.job_queue import JobQueue
+from services.media_cache import MediaCacheService
+from services.metadata_cache import MetadataCacheService
+from services.streaming import StreamingService
+from services.yt_dlp import DLPService
+from utils.app_utils import upload_to_telegram, send_photo, upload_big_file, get_upload_limit
+
+
+class DownloadPipeline:
+    """
+    Runs a download job: download, upload to the channel and notify the user.
+    """
+
+    @classmethod
+    async def run(cls, bot: Bot, record: Job) -> None:
+        """
+        Run the job in its scratch directory, resuming after the last stage it completed in an earlier attempt.
+        """
+        # The files of a job interrupted by a shutdown are kept for the attempt resuming it
+        async with scratch.job(str(record.id), keep_on_cancel=True) as directory:
+            # Streaming always produces MP3, since other containers cannot be written to a pipe as they are
+            if settings.STREAMING_UPLOADS and get_output_format().codec == 'mp3':
+                return await cls.run_streaming(bot, record, directory)
+            return await cls.run_download(bot, record, directory)
+
+    @classmethod
+    async def run_download(cls, bot: Bot, record: Job, directory: str) -> None:
+        """
+        Run the job by downloading the file, tagging it and uploading it.
+        """
+        job = record.job
+        download_service = DLPService()
+
+        # Update the status message now that the job has left the queue
+        await cls.edit_status(bot, job, await cls._get_downloading_status(job))
+
+        # Download the audio file and get the file location, thumbnail location, caption, and metadata,
+        # unless the files of an earlier attempt are still there
+        audio_data = cls._get_resumable_audio(record)
+        try:
+            if audio_data is None:
+                audio_data = await download_service.download(
+                    url=job.url,
+                    directory=directory,
+                    on_stage=partial(JobQueue.checkpoint, record),
+                )
+            elif not JobQueue.reached(record, 'tagged'):
+                audio_data = await download_service.encode(
+                    audio_data,
+                    video_id=job.video_id,
+                    on_stage=partial(JobQueue.checkpoint, record),
+                )
+        except Exception as e:
+            logger.error(f"An error occurred while downloading audio: {e}")
+            await cls.edit_status(bot, job, "An error occured")
+            raise
+
+        audio_message = None
+        if JobQueue.reached(record, 'uploaded'):
+            audio_message_id = record.audio_message_id
+        else:
+            # After downloading is done, update the message to indicate that the download is complete
+            await cls.edit_status(bot, job, f"<b>🎵 {audio_data.title}</b>\n\nDownloading - DONE\nUploading ...")
+
+            # Upload the file to Telegram according to its size
+            try:
+                audio_message, audio_message_id = await cls.upload(bot, audio_data)
+            except Exception as e:
+                logger.error(f"An error occurred while uploading the file: {e}")
+                await cls.edit_status(bot, job, "An error occurred")
+                raise
+
+            message_id = audio_message.message_id if audio_message else audio_message_id
+            await JobQueue.checkpoint(record, 'uploaded', audio_data, audio_message_id=message_id)
+
+        await cls.finish(bot, job, audio_data, audio_message=audio_message, audio_message_id=audio_message_id)
+        await JobQueue.checkpoint(record, 'notified')
+
+        return None
+
+    @staticmethod
+    def _get_resumable_audio(record: Job) -> AudioData | None:
+        """
+        Get the audio data of an earlier attempt if its files can be reused.
+        """
+        audio_data = record.audio_data
+        if audio_data is None or not JobQueue.reached(record, 'downloaded'):
+            return None
+
+        # The files are not needed anymore once they are uploaded
+        if JobQueue.reached(record, 'uploaded'):
+            return audio_data
+
+        # Encoding resumes from the source, the upload from the finished file
+        file_path = audio_data.file_path if JobQueue.reached(record, 'tagged') else audio_data.source_path
+        if file_path and os.path.exists(file_path):
+            return audio_data
+        return None
+
+    @classmethod
+    async def upload(cls, bot: Bot, audio_data: AudioData) -> tuple[Message | None, int | None]:
+        """
+        Upload the downloaded file to the channel, through the Bot API or, if it is too big for it, MTProto.
+
+        :return: The message sent by the Bot API, or the ID of the message sent over MTProto.
+        """
+        file_location, thumbnail_location, file_caption, data = audio_data.file_path, audio_data.thumbnail_path, audio_data.title, {"artist": audio_data.artist, "title": audio_data.title, "mime_type": audio_data.mime_type}
+
+        async with scheduler.pool('upload'):
+            file_size = os.path.getsize(file_location)
+            bytes_transferred.inc(file_size, direction='uploaded')
+
+            if file_size > get_upload_limit(bot):
+                with stage_seconds.time(stage='upload_mtproto'):
+                    return None, await upload_big_file(file_location, thumbnail_location, data)
+            with stage_seconds.time(stage='upload_bot_api'):
+                return await upload_to_telegram(bot, file_location, thumbnail_location, file_caption), None
+
+    @classmethod
+    async def run_streaming(cls, bot: Bot, record: Job, directory: str) -> None:
+        """
+        Run the job with the download, encoding and upload overlapping each other.
+
+        A stream cannot be resumed halfway, so an interrupted job starts over unless it was already uploaded.
+        """
+        job = record.job
+
+        if JobQueue.reached(record, 'uploaded'):
+            audio_data, audio_message_id = record.audio_data, record.audio_message_id
+        else:
+            download_service = DLPService()
+
+            await cls.edit_status(bot, job, await cls._get_downloading_status(job))
+
+            try:
+                audio_data, source_url, headers = await download_service.prepare_stream(url=job.url, directory=directory)
+            except Exception as e:
+                logger.error(f"An error occurred while preparing the audio stream: {e}")
+                await cls.edit_status(bot, job, "An error occured")
+                raise
+            await JobQueue.checkpoint(record, 'extracted')
+
+            await cls.edit_status(bot, job, f"<b>🎵 {audio_data.title}</b>\n\nDownloading and uploading ...")
+
+            try:
+                async with scheduler.pool('transcode'), scheduler.pool('upload'):
+                    audio_message_id = await StreamingService.upload(audio_data, source_url, headers)
+            except Exception as e:
+                logger.error(f"An error occurred while streaming the file: {e}")
+                await cls.edit_status(bot, job, "An error occurred")
+                raise
+            await JobQueue.checkpoint(record, 'uploaded', audio_data, audio_message_id=audio_message_id)
+
+        await cls.finish(bot, job, audio_data, audio_message_id=audio_message_id)
+        await JobQueue.checkpoint(record, 'notified')
+
+        return None
+
+    @classmethod
+    async def finish(
+            cls,
+            bot: Bot,
+            job: DownloadJob,
+            audio_data: AudioData,
+            audio_message: Message | None = None,
+            audio_message_id: int | None = None,
+    ) -> None:
+        """
+        Notify the user about the upload and cache it.
+        """
+
+        # After the upload is complete, send a message with the thumbnail and caption in the chat
+        caption = f"<b>🎵 {audio_data.title}</b>\n\nSuccessfully uploaded to the channel."
+        if audio_data.thumbnail_path and os.path.exists(audio_data.thumbnail_path):
+            photo_message = await send_photo(bot=bot, chat_id=job.chat_id, photo_path=audio_data.thumbnail_path, caption=caption)
+        else:
+            # The thumbnail of a resumed job may be gone
+            photo_message = None
+            await bot.send_message(chat_id=job.chat_id, text=caption)
+
+        # Remember the upload so repeat requests can skip the download
+        if job.video_id:
+            try:
+                await MediaCacheService.store(
+                    video_id=job.video_id,
+                    title=audio_data.title,
+                    artist=audio_data.artist,
+                    audio_message=audio_message,
+                    message_id=audio_message_id,
+                    photo_message=photo_message,
+                )
+            except Exception as e:
+                logger.error(f"An error occurred while caching the upload: {e}")
+
+        # Delete the messages
+        await bot.delete_message(chat_id=job.chat_id, message_id=job.status_message_id)
+        await bot.delete_message(chat_id=job.chat_id, message_id=job.message_id)
+
+    @staticmethod
+    async def _get_downloading_status(job: DownloadJob) -> str:
+        metadata = await MetadataCacheService.get(job.video_id) if job.video_id else None
+        if metadata:
+            return f"<b>🎵 {metadata.title}</b>\n\nDownloading ..."
+        return "Downloading ..."
+
+    @staticmethod
+    async def edit_status(bot: Bot, job: DownloadJob, text: str) -> None:
+        """
+        Update the status message of the job.
+        """
+        try:
+            await bot.edit_message_text(
+                text=text,
+                chat_id=job.chat_id,
+                message_id=job.status_message_id,
+                disable_web_page_preview=True,
+            )
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                logger.warning(f"Failed to update the status message: {e}")
+        except Exception as e:
+            logger.warning(f"Failed to update the status message: {e}")
@@ -0,0 +1,127 @@
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable
+
+from config.logging_conf import logger
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no free slots."""
+
+
+class UserLimitError(Exception):
+    """Raised when the user already has the maximum number of jobs in flight."""
+
+
+class JobScheduler:
+    """
+    Bounded scheduler for download jobs.
+
+    Jobs wait in a bounded queue and are run by a fixed number of workers.
+    Each user may have a limited number of jobs queued or running at once, and
+    the stages of a job acquire slots in separate capacity pools.
+    """
+
+    def __init__(self, workers: int, per_user: int, queue_size: int, pools: dict[str, int]):
+        self._workers = workers
+        self._per_user = per_user
+        self._queue: asyncio.Queue[tuple[int, Callable[[], Awaitable]]] = asyncio.Queue(maxsize=queue_size)
+        self._pools = {name: asyncio.Semaphore(size) for name, size in pools.items()}
+        self._pool_sizes = dict(pools)
+        self._in_flight: dict[int, int] = defaultdict(int)
+        self._running = 0
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def users_at_limit(self) -> list[int]:
+        """
+        The IDs of the users who cannot have another job admitted.
+        """
+        return [user_id for user_id, count in self._in_flight.items() if count >= self._per_user]
+
+    @property
+    def pool_sizes(self) -> dict[str, int]:
+        return self._pool_sizes
+
+    async def start(self) -> None:
+        """
+        Start the worker tasks.
+        """
+        for index in range(self._workers):
+            self._tasks.append(asyncio.create_task(self._worker(index)))
+        logger.info(f"Job scheduler started with {self._workers} workers.")
+
+    async def stop(self) -> None:
+        """
+        Cancel the worker tasks.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def check_admission(self, user_id: int) -> int:
+        """
+        Check whether a job of the given user would be accepted.
+
+        :return: The position the job would have in line, 0 if it would start immediately.
+        :raises UserLimitError: If the user has too many jobs in flight.
+        :raises QueueFullError: If the queue is full.
+        """
+        if self._in_flight[user_id] >= self._per_user:
+            raise UserLimitError(f"User {user_id} already has {self._per_user} jobs in flight.")
+
+        if self._queue.full():
+            raise QueueFullError("The job queue is full.")
+
+        if self._running + self._queue.qsize() < self._workers:
+            return 0
+        return self._queue.qsize() + 1
+
+    def submit(self, user_id: int, job: Callable[[], Awaitable]) -> int:
+        """
+        Put the job into the queue.
+
+        :param user_id: The ID of the user who requested the job.
+        :param job: A callable returning the coroutine to run.
+        :return: The position of the job in line, 0 if it starts immediately.
+        """
+        position = self.check_admission(user_id)
+
+        self._queue.put_nowait((user_id, job))
+        self._in_flight[user_id] += 1
+
+        return position
+
+    @asynccontextmanager
+    async def pool(self, name: str):
+        """
+        Acquire a slot in the given capacity pool.
+        """
+        async with self._pools[name]:
+            yield
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            user_id, job = await self._queue.get()
+            self._running += 1
+
+            try:
+                await job()
+            except Exception as e:
+                logger.error(f"Worker {index}: job of user {user_id} failed: {e}")
+            finally:
+                self._running -= 1
+                self._in_flight[user_id] -= 1
+                if self._in_flight[user_id] <= 0:
+                    del self._in_flight[user_id]
+                self._queue.task_done()
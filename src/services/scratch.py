@@ -0,0 +1,151 @@
+import asyncio
+import os
+import shutil
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+from config.logging_conf import logger
+
+
+class ScratchSpace:
+    """
+    Working directory of the jobs, split into one directory per job.
+
+    Each job reserves a minimum number of bytes of the quota while its directory exists, raised with `reserve`
+    once the size of its files is known, and waits for other jobs to finish if the quota is used up. The quota
+    is checked against the measured usage too, which counts files that outgrew their reservation and files
+    kept for resumption. The directory is removed when the job leaves its context, and directories left by
+    crashed processes are removed by `sweep` once they are old enough.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, job_bytes: int, max_age: float):
+        """
+        :param directory: The root of the job directories, e.g. a tmpfs mount.
+        :param max_bytes: The quota shared by the jobs, 0 for no quota.
+        :param job_bytes: The minimum bytes reserved by each job.
+        :param max_age: Seconds after which the directory of an inactive job is removed by `sweep`.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.job_bytes = job_bytes
+        self.max_age = max_age
+        self.swept_bytes = 0
+        self.used_bytes = 0
+        # Bytes reserved by each active job, by key
+        self._active: dict[str, int] = {}
+        self._reserved = 0
+        self._released = asyncio.Event()
+
+    @property
+    def active(self) -> int:
+        return len(self._active)
+
+    @property
+    def reserved(self) -> int:
+        return self._reserved
+
+    def has_room(self) -> bool:
+        """
+        Check whether another job fits in the quota. A single job is always let in, even if it exceeds it.
+
+        The reservations are compared with the usage as of the last `usage` call, whichever is higher.
+        """
+        used = max(self._reserved, self.used_bytes)
+        return not self.max_bytes or not self._reserved or used + self.job_bytes <= self.max_bytes
+
+    @asynccontextmanager
+    async def job(self, key: str | None = None, keep_on_cancel: bool = False):
+        """
+        Reserve room in the quota and create a directory for the job, waiting until the quota allows it.
+        The directory and everything in it are removed on exit.
+
+        :param key: The name of the directory, a random one by default.
+            A job resumed with the same key finds the files of its earlier attempt.
+        :param keep_on_cancel: Keep the directory if the job is cancelled, so it can be resumed after a restart.
+        :return: The path of the directory.
+        """
+        while not self.has_room():
+            self._released.clear()
+            await self._released.wait()
+
+        key = key or uuid.uuid4().hex
+        path = os.path.join(self.directory, key)
+
+        self._reserved += self.job_bytes
+        self._active[key] = self.job_bytes
+        keep = False
+        try:
+            os.makedirs(path, exist_ok=True)
+            yield path
+        except asyncio.CancelledError:
+            keep = keep_on_cancel
+            raise
+        finally:
+            self._reserved -= self._active.pop(key)
+            self._released.set()
+            if not keep:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def reserve(self, directory: str, size: int) -> None:
+        """
+        Raise the reservation of the job owning the given directory to the given bytes, e.g. once the size
+        of its download is known. Running jobs are never held back, later jobs wait for the room instead.
+        """
+        key = os.path.basename(directory)
+        if key in self._active and size > self._active[key]:
+            self._reserved += size - self._active[key]
+            self._active[key] = size
+
+    def usage(self) -> int:
+        """
+        Get the bytes currently used by the files in the scratch directory, and keep them in `used_bytes`.
+        """
+        self.used_bytes = self._get_size(self.directory)
+        return self.used_bytes
+
+    def sweep(self) -> int:
+        """
+        Remove the entries of the scratch directory that belong to no active job
+        and were not modified for `max_age` seconds.
+
+        :return: The number of bytes freed.
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+
+        freed = 0
+        expires_before = time.time() - self.max_age
+        for entry in os.scandir(self.directory):
+            if entry.name in self._active:
+                continue
+            try:
+                if entry.stat(follow_symlinks=False).st_mtime > expires_before:
+                    continue
+                size = self._get_size(entry.path)
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.remove(entry.path)
+            except OSError as e:
+                logger.warning(f"Failed to remove {entry.path} from the scratch directory: {e}")
+                continue
+            freed += size
+
+        if freed:
+            logger.info(f"Removed {freed} bytes of abandoned files from {self.directory}")
+        self.swept_bytes += freed
+        return freed
+
+    @classmethod
+    def _get_size(cls, path: str) -> int:
+        try:
+            if not os.path.isdir(path):
+                return os.path.getsize(path)
+            return sum(
+                cls._get_size(entry.path) if entry.is_dir(follow_symlinks=False) else entry.stat().st_size
+                for entry in os.scandir(path)
+            )
+        except OSError:
+            # Removed while being counted
+            return 0
@@ -0,0 +1,97 @@
+import asyncio
+from typing import AsyncIterator
+
+from config import settings
+from config.logging_conf import logger
+from core.metrics import bytes_transferred, stage_seconds
+from core.templates import AudioData
+from services.telethon import TelethonService
+from utils.dlp_utils import valid_filename
+
+
+class StreamingService:
+    """
+    Service for transcoding and uploading audio in one streaming pass.
+
+    FFmpeg reads the source stream, encodes it to MP3 with tags and cover art,
+    and writes it to a pipe. The parts are uploaded over MTProto as soon as they
+    are produced, so the audio file never lands on disk and the upload overlaps
+    with the download and the encoding.
+    """
+
+    @classmethod
+    async def upload(cls, audio_data: AudioData, source_url: str, headers: dict[str, str]) -> int | None:
+        """
+        Stream the audio from the source to the channel.
+
+        :return: The ID of the sent message.
+        """
+        logger.info("Streaming audio ...")
+
+        process = await asyncio.create_subprocess_exec(
+            *cls._get_ffmpeg_command(audio_data, source_url, headers),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+
+        try:
+            with stage_seconds.time(stage='stream'):
+                message_id = await TelethonService.upload_stream(
+                    chunks=cls._read_chunks(process, settings.UPLOAD_PART_SIZE),
+                    file_name=f"{valid_filename(audio_data.title)}.mp3",
+                    cover_image_path=audio_data.thumbnail_path,
+                    data={"artist": audio_data.artist, "title": audio_data.title, "mime_type": "audio/mpeg"},
+                )
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+        logger.info("Audio streamed successfully")
+        return message_id
+
+    @staticmethod
+    async def _read_chunks(process: asyncio.subprocess.Process, part_size: int) -> AsyncIterator[bytes]:
+        """
+        Read the FFmpeg output in upload-sized parts.
+
+        Fails before the last part is handed out if FFmpeg exits with an error,
+        so a truncated file is never sent.
+        """
+        while True:
+            try:
+                chunk = await process.stdout.readexactly(part_size)
+            except asyncio.IncompleteReadError as e:
+                chunk = e.partial
+                break
+            bytes_transferred.inc(len(chunk), direction='uploaded')
+            yield chunk
+
+        stderr = await process.stderr.read()
+        if await process.wait() != 0:
+            raise RuntimeError(f"FFmpeg failed: {stderr.decode(errors='replace').strip()}")
+
+        if chunk:
+            bytes_transferred.inc(len(chunk), direction='uploaded')
+            yield chunk
+
+    @staticmethod
+    def _get_ffmpeg_command(audio_data: AudioData, source_url: str, headers: dict[str, str]) -> list[str]:
+        header_lines = "".join(f"{key}: {value}\r\n" for key, value in headers.items())
+        header_args = ['-headers', header_lines] if header_lines else []
+
+        return [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error',
+            *header_args, '-i', source_url,
+            '-i', audio_data.thumbnail_path,
+            '-map', '0:a:0', '-map', '1:v:0',
+            '-c:a', 'libmp3lame', '-b:a', f'{settings.AUDIO_BITRATE}k',
+            '-c:v', 'mjpeg',
+            '-id3v2_version', '3',
+            '-metadata', f'title={audio_data.title}',
+            '-metadata', f'artist={audio_data.artist}',
+            '-metadata:s:v', 'title=Album cover',
+            '-metadata:s:v', 'comment=Cover (front)',
+            '-f', 'mp3', 'pipe:1',
+        ]
@@ -1,28 +1,61 @@
 import asyncio
+import os
 import random
+import sys
+from typing import AsyncIterator, Awaitable
 from telethon import TelegramClient
+from telethon.errors import ChannelInvalidError, ChannelPrivateError
 from telethon.tl.types import InputFile, InputFileBig, DocumentAttributeAudio
+from telethon.tl.types import UpdateNewChannelMessage, UpdateNewMessage
 from telethon.tl.functions.messages import SendMediaRequest
 from telethon.tl.types import InputMediaUploadedDocument
 from telethon.utils import get_input_peer
 
 from config.logging_conf import logger
-from config.settings import API_ID, API_HASH, PHONE_NUMBER, CHANNEL_URL
+from config.settings import API_ID, API_HASH, PHONE_NUMBER, CHANNEL_URL, CHANNEL_ID, TELETHON_SESSION
+from config.settings import UPLOAD_CONNECTIONS, UPLOAD_PART_SIZE, UPLOAD_PART_RETRIES
+from services.uploader import ParallelUploader
+
+# Files above this size are uploaded as InputFileBig
+BIG_FILE_SIZE = 10 * 1024 * 1024
 
 class TelethonService:
     """
     Service for managing Telethon client operations.
+
+    The client is started once and kept for the lifetime of the process.
     """
     client = None
+    input_peer = None
+    _lock = asyncio.Lock()
+
+    @classmethod
+    async def upload_files(cls, audio_file_path: str, cover_image_path: str, data: dict[str, str]) -> int | None:
+
+        # Make sure the long-lived client is connected
+        await cls.ensure_client()
+
+        return await cls._send_audio(cls.upload_file(audio_file_path), cover_image_path, data)
 
     @classmethod
-    async def upload_files(cls, audio_file_path: str, cover_image_path: str, data: dict[str, str]) -> None:
+    async def upload_stream(cls, chunks: AsyncIterator[bytes], file_name: str, cover_image_path: str, data: dict[str, str]) -> int | None:
+        """
+        Upload audio while it is still being produced.
+
+        The chunks must be `UPLOAD_PART_SIZE` bytes long, except the last one.
+        Streams that end below the big file threshold are buffered in memory and uploaded as a regular file.
+        """
+
+        # Make sure the long-lived client is connected
+        await cls.ensure_client()
 
-        # Start the Telethon client if not already started
-        await cls.start_client()
+        return await cls._send_audio(cls._upload_chunks(chunks, file_name), cover_image_path, data)
+
+    @classmethod
+    async def _send_audio(cls, audio_upload: Awaitable, cover_image_path: str, data: dict[str, str]) -> int | None:
 
         # Upload the cover image and audio file, and retrieve the input peer
-        tasks = [cls.client.upload_file(cover_image_path), cls.client.upload_file(audio_file_path), cls.retrieve_input_peer()]
+        tasks = [cls.client.upload_file(cover_image_path), audio_upload, cls.retrieve_input_peer()]
         cover_img, audio_file, input_peer = await asyncio.gather(*tasks)
 
         # Process the uploaded files to determine if they are large or small
@@ -34,50 +67,149 @@ class TelethonService:
         media = cls._get_media_document(
             file=input_audio,
             cover_image=input_cover,
-            audio_attributes=audio_attributes
+            audio_attributes=audio_attributes,
+            mime_type=data.get('mime_type', 'audio/mpeg')
+        )
+
+        # Send the media document and return the ID of the sent message
+        try:
+            return await cls.send_media(media, data['title'], input_peer)
+        except (ValueError, ChannelInvalidError, ChannelPrivateError):
+            # The cached peer is no longer valid, resolve it again next time
+            cls.input_peer = None
+            raise
+
+    @classmethod
+    async def _upload_chunks(cls, chunks: AsyncIterator[bytes], file_name: str):
+        buffered, size = [], 0
+
+        # Buffer the beginning of the stream until it is known to be a big file
+        async for chunk in chunks:
+            buffered.append(chunk)
+            size += len(chunk)
+            if size > BIG_FILE_SIZE:
+                break
+        else:
+            return await cls.client.upload_file(b''.join(buffered), file_name=file_name)
+
+        async def all_chunks():
+            for buffered_chunk in buffered:
+                yield buffered_chunk
+            buffered.clear()
+            async for rest in chunks:
+                yield rest
+
+        return await cls._get_uploader().upload(chunks=all_chunks(), file_name=file_name)
+
+    @classmethod
+    def _get_uploader(cls, progress_callback=None) -> ParallelUploader:
+        return ParallelUploader(
+            client=cls.client,
+            connections=UPLOAD_CONNECTIONS,
+            part_size=UPLOAD_PART_SIZE,
+            retries=UPLOAD_PART_RETRIES,
+            progress_callback=progress_callback,
         )
 
-        # Send the media document
-        await cls.send_media(media, data['title'], input_peer)
+    @classmethod
+    async def upload_file(cls, file_path: str, progress_callback=None):
+        """
+        Upload a file, sending the parts of big files over several connections in parallel.
+        """
+        if os.path.getsize(file_path) <= BIG_FILE_SIZE:
+            return await cls.client.upload_file(file_path, progress_callback=progress_callback)
 
+        return await cls._get_uploader(progress_callback).upload_file(file_path)
 
     @classmethod
     async def start_client(cls):
         """
-        Start the Telethon client.
+        Start the Telethon client and resolve the channel peer.
+
+        The session must be logged in beforehand if the process has no terminal to ask for the login code.
+        """
+        async with cls._lock:
+            if cls.client is None:
+                cls.client = TelegramClient(TELETHON_SESSION, API_ID, API_HASH)
+            await cls.client.connect()
+            if not sys.stdin.isatty() and not await cls.client.is_user_authorized():
+                raise RuntimeError(
+                    f"Telethon session {TELETHON_SESSION} is not logged in, start the process once in a terminal to log in."
+                )
+            await cls.client.start(phone=PHONE_NUMBER)
+            logger.info("Telethon client started successfully.")
+
+        await cls.retrieve_input_peer()
+
+    @classmethod
+    async def stop_client(cls):
+        """
+        Disconnect the Telethon client.
         """
-        cls.client = TelegramClient('session_name', API_ID, API_HASH)
-        await cls.client.start(phone=PHONE_NUMBER)
-        logger.info("Telethon client started successfully.")
+        if cls.client is not None:
+            await cls.client.disconnect()
+            logger.info("Telethon client disconnected.")
+
+    @classmethod
+    async def ensure_client(cls):
+        """
+        Start the client if it was never started, or reconnect it if the connection was lost.
+        """
+        if cls.client is None:
+            await cls.start_client()
+            return
+
+        if not cls.client.is_connected():
+            logger.warning("Telethon client is disconnected, reconnecting ...")
+            async with cls._lock:
+                if not cls.client.is_connected():
+                    await cls.client.connect()
 
     @classmethod
     async def retrieve_input_peer(cls):
         """
         Get the input peer for the channel.
+
+        The peer is cached in memory, and Telethon persists the access hash in the session file,
+        so the channel is resolved over the network only once.
         """
-        entity = await cls.client.get_entity(CHANNEL_URL)
-        return get_input_peer(entity)
+        if cls.input_peer is not None:
+            return cls.input_peer
+
+        try:
+            # Served from the session file if the channel has been seen before
+            cls.input_peer = await cls.client.get_input_entity(CHANNEL_ID)
+        except ValueError:
+            entity = await cls.client.get_entity(CHANNEL_URL)
+            cls.input_peer = get_input_peer(entity)
+
+        return cls.input_peer
 
     @classmethod
-    async def send_media(cls, media, message, input_peer):
+    async def send_media(cls, media, message, input_peer) -> int | None:
         """
-        Send media to the specified input peer.
+        Send media to the specified input peer and return the sent message ID.
         """
-        await cls.client(SendMediaRequest(
+        result = await cls.client(SendMediaRequest(
             peer=input_peer,
             media=media,
             message=message,
             random_id=random.randint(-9223372036854775808, 9223372036854775807)
         ))
 
+        for update in getattr(result, 'updates', []):
+            if isinstance(update, (UpdateNewChannelMessage, UpdateNewMessage)):
+                return update.message.id
+        return None
+
     @staticmethod
-    def _get_media_document(file, cover_image, audio_attributes):
+    def _get_media_document(file, cover_image, audio_attributes, mime_type='audio/mpeg'):
         """
         Create a media document for the uploaded file.
         """
         return InputMediaUploadedDocument(
             file=file,
-            mime_type='audio/mpeg',
+            mime_type=mime_type,
             attributes=[audio_attributes],
             thumb=cover_image
         )
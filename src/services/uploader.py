@@ -0,0 +1,185 @@
+import asyncio
+import inspect
+import math
+import os
+import random
+from typing import AsyncIterator, Callable
+
+from telethon import TelegramClient
+from telethon.errors import FloodWaitError, RPCError
+from telethon.network import MTProtoSender
+from telethon.tl.functions.upload import SaveBigFilePartRequest
+from telethon.tl.types import InputFileBig
+
+from config.logging_conf import logger
+
+# Telegram accepts parts of at most 512 KB, and 512 KB must be divisible by the part size
+MAX_PART_SIZE = 512 * 1024
+
+
+class ParallelUploader:
+    """
+    Uploads big files to Telegram over several MTProto connections at once.
+
+    Telethon's `upload_file` sends the parts one after another over a single connection.
+    This uploader opens extra senders to the DC of the session, reusing its auth key,
+    and sends `SaveBigFilePartRequest` parts through all of them concurrently.
+    """
+
+    def __init__(
+            self,
+            client: TelegramClient,
+            connections: int = 4,
+            part_size: int = MAX_PART_SIZE,
+            retries: int = 3,
+            progress_callback: Callable[[int, int | None], object] | None = None,
+    ):
+        if part_size % 1024 != 0 or MAX_PART_SIZE % part_size != 0:
+            raise ValueError(f"Invalid part size: {part_size}")
+
+        self.client = client
+        self.connections = connections
+        self.part_size = part_size
+        self.retries = retries
+        self.progress_callback = progress_callback
+
+    async def upload_file(self, file_path: str) -> InputFileBig:
+        """
+        Upload the file at the given path.
+
+        :return: The uploaded file, to be used in `InputMediaUploadedDocument`.
+        """
+        size = os.path.getsize(file_path)
+        total_parts = math.ceil(size / self.part_size)
+
+        return await self.upload(
+            chunks=self._read_file(file_path),
+            file_name=os.path.basename(file_path),
+            total_parts=total_parts,
+            total_size=size,
+        )
+
+    async def upload(
+            self,
+            chunks: AsyncIterator[bytes],
+            file_name: str,
+            total_parts: int = -1,
+            total_size: int | None = None,
+    ) -> InputFileBig:
+        """
+        Upload the file produced by the given chunks.
+
+        Every chunk except the last one must be exactly `part_size` bytes long.
+        If the number of parts is not known in advance, pass -1 and the total is
+        sent along with the last part.
+        """
+        file_id = random.randrange(-2 ** 63, 2 ** 63)
+        queue: asyncio.Queue[tuple[int, bytes, int] | None] = asyncio.Queue(maxsize=self.connections * 2)
+        senders = await self._create_senders()
+        uploaded = 0
+        parts = 0
+
+        async def produce():
+            nonlocal parts
+            index = 0
+            pending = None
+
+            # Read one chunk ahead, so the last part can carry the real total
+            async for chunk in chunks:
+                if pending is not None:
+                    await queue.put((index, pending, total_parts))
+                    index += 1
+                pending = chunk
+
+            if pending is not None:
+                await queue.put((index, pending, index + 1))
+                index += 1
+
+            parts = index
+            for _ in senders:
+                await queue.put(None)
+
+        async def consume(sender: MTProtoSender):
+            nonlocal uploaded
+            while (item := await queue.get()) is not None:
+                index, data, total = item
+                await self._send_part(sender, file_id, index, total, data)
+
+                uploaded += len(data)
+                await self._report_progress(uploaded, total_size)
+
+        try:
+            async with asyncio.TaskGroup() as group:
+                group.create_task(produce())
+                for sender in senders:
+                    group.create_task(consume(sender))
+        finally:
+            await asyncio.gather(*(sender.disconnect() for sender in senders), return_exceptions=True)
+
+        logger.info(f"Uploaded {file_name} in {parts} parts over {len(senders)} connections.")
+        return InputFileBig(id=file_id, parts=parts, name=file_name)
+
+    async def _send_part(self, sender: MTProtoSender, file_id: int, index: int, total: int, data: bytes) -> None:
+        request = SaveBigFilePartRequest(
+            file_id=file_id,
+            file_part=index,
+            file_total_parts=total,
+            bytes=data,
+        )
+
+        for attempt in range(1, self.retries + 1):
+            try:
+                if await sender.send(request):
+                    return
+                raise RuntimeError(f"Telegram did not accept part {index}")
+            except FloodWaitError as e:
+                logger.warning(f"Flood wait of {e.seconds}s while uploading part {index}")
+                await asyncio.sleep(e.seconds)
+            except (RPCError, RuntimeError, ConnectionError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Failed to upload part {index} (attempt {attempt}): {e}")
+                await asyncio.sleep(2 ** attempt)
+
+        raise RuntimeError(f"Failed to upload part {index} after {self.retries} attempts")
+
+    async def _create_senders(self) -> list[MTProtoSender]:
+        """
+        Connect extra senders to the DC of the session, reusing its auth key.
+        """
+        client = self.client
+        dc = await client._get_dc(client.session.dc_id)  # noqa
+
+        async def create_sender() -> MTProtoSender:
+            sender = MTProtoSender(client.session.auth_key, loggers=client._log)  # noqa
+            await sender.connect(client._connection(  # noqa
+                dc.ip_address,
+                dc.port,
+                dc.id,
+                loggers=client._log,  # noqa
+                proxy=client._proxy,  # noqa
+            ))
+            return sender
+
+        results = await asyncio.gather(*(create_sender() for _ in range(self.connections)), return_exceptions=True)
+        senders = [result for result in results if isinstance(result, MTProtoSender)]
+        errors = [result for result in results if isinstance(result, BaseException)]
+
+        if errors:
+            await asyncio.gather(*(sender.disconnect() for sender in senders), return_exceptions=True)
+            raise errors[0]
+
+        return senders
+
+    async def _read_file(self, file_path: str) -> AsyncIterator[bytes]:
+        with open(file_path, 'rb') as f:
+            while chunk := await asyncio.to_thread(f.read, self.part_size):
+                yield chunk
+
+    async def _report_progress(self, uploaded: int, total: int | None) -> None:
+        if self.progress_callback is None:
+            return
+
+        result = self.progress_callback(uploaded, total)
+        if inspect.isawaitable(result):
+            await result
@@ -4,8 +4,10 @@ import yt_dlp
 
 from config import settings
 from config.logging_conf import logger
+from core.metrics import bytes_transferred, stage_seconds
 from core.templates import AudioMetadata
 from services.download.base import BaseDownloadService
+from services.download.formats import get_format_selector, TRANSCODE_FORMAT_SELECTOR
 
 
 class DLPService(BaseDownloadService):
@@ -17,12 +19,13 @@ class DLPService(BaseDownloadService):
         logger.info(f"Using cookies file: {cookies_file}")
 
     @classmethod
-    async def get_audio_details(cls, url: str) -> AudioMetadata:
+    async def extract_info(cls, url: str) -> dict:
 
         ydl_opts_info = {
             'skip_download': True,
             'quiet': True,
             'extract_flat': 'in_playlist',
+            'noplaylist': True,
             **cls.extra_kwargs
         }
 
@@ -31,8 +34,9 @@ class DLPService(BaseDownloadService):
             logger.info("Extracting audio details ...")
 
             try:
+                # Skip processing, so the raw info can be processed by the download later
                 with yt_dlp.YoutubeDL(ydl_opts_info) as ydl:
-                    return ydl.extract_info(url, download=False)
+                    return ydl.extract_info(url, download=False, process=False)
             except Exception as e:
                 logger.error(f"Failed to extract audio details: {str(e)}")
                 raise
@@ -41,24 +45,74 @@ class DLPService(BaseDownloadService):
         info = await asyncio.to_thread(extract_info)
         logger.info("Audio details extracted successfully")
 
+        return info
+
+    @classmethod
+    async def list_entries(cls, url: str) -> list[str]:
+
+        ydl_opts_entries = {
+            'skip_download': True,
+            'quiet': True,
+            'extract_flat': True,
+            **cls.extra_kwargs
+        }
+
+        def extract_entries():
+
+            logger.info("Extracting playlist entries ...")
+
+            try:
+                # A single flat extraction lists all entries without resolving them
+                with yt_dlp.YoutubeDL(ydl_opts_entries) as ydl:
+                    return ydl.extract_info(url, download=False)
+            except Exception as e:
+                logger.error(f"Failed to extract playlist entries: {str(e)}")
+                raise
+
+        # Run in thread pool to avoid blocking
+        info = await asyncio.to_thread(extract_entries)
+
+        if info.get('_type') != 'playlist':
+            return [url]
+
+        urls = []
+        for entry in info.get('entries') or []:
+            if entry.get('ie_key') == 'Youtube' and entry.get('id'):
+                urls.append(f"https://www.youtube.com/watch?v={entry['id']}")
+            elif entry.get('url'):
+                urls.append(entry['url'])
+
+        logger.info(f"Extracted {len(urls)} playlist entries")
+        return urls
+
+    @classmethod
+    async def get_audio_details(cls, info: dict) -> AudioMetadata:
+
         artist = info.get('uploader', 'Unknown Artist')
         title = info.get('title', 'Unknown Title')
-        thumbnail_url = info.get('thumbnail', None)
+        thumbnail_url = cls._get_thumbnail_url(info)
+        duration = info.get('duration')
+        filesize = cls._estimate_filesize(info)
 
-        return AudioMetadata(artist=artist, title=title, thumbnail_url=thumbnail_url)
+        return AudioMetadata(artist=artist, title=title, thumbnail_url=thumbnail_url, duration=duration, filesize=filesize)
 
     @classmethod
-    async def download_audio(cls, url: str, save_path: str) -> None:
+    async def download_audio(cls, info: dict, save_path: str) -> str:
+
+        def on_progress(progress: dict) -> None:
+            if progress['status'] == 'finished':
+                if progress.get('elapsed') is not None:
+                    stage_seconds.observe(progress['elapsed'], stage='download')
+                downloaded = progress.get('total_bytes') or progress.get('downloaded_bytes')
+                if downloaded:
+                    bytes_transferred.inc(downloaded, direction='downloaded')
 
         ydl_opts_audio = {
-            'format': 'bestaudio/best',
+            'format': get_format_selector(),
             'quiet': True,
-            'outtmpl': save_path.rstrip('.mp3'),
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }],
+            # The source is converted and tagged afterwards by `encode_audio`
+            'outtmpl': f'{save_path}.%(ext)s',
+            'progress_hooks': [on_progress],
             **cls.extra_kwargs
         }
 
@@ -66,13 +120,72 @@ class DLPService(BaseDownloadService):
             logger.info("Downloading audio ...")
 
             try:
+                # Reuse the extracted info instead of querying the source again
                 with yt_dlp.YoutubeDL(ydl_opts_audio) as ydl:
-                    ydl.download([url])
+                    result = ydl.process_ie_result(dict(info), download=True)
             except Exception as e:
                 logger.error(f"Failed to download audio: {str(e)}")
                 raise
 
-            logger.info(f"Audio downloaded successfully to {save_path}")
+            file_path = result['requested_downloads'][0]['filepath']
+            logger.info(f"Audio downloaded successfully to {file_path}")
+            return file_path
+
+        # Run in thread pool to avoid blocking
+        return await asyncio.to_thread(download_audio)
+
+    @classmethod
+    async def get_stream_source(cls, info: dict) -> tuple[str, dict[str, str]]:
+
+        ydl_opts_stream = {
+            'format': TRANSCODE_FORMAT_SELECTOR,
+            'quiet': True,
+            **cls.extra_kwargs
+        }
+
+        def select_format():
+            try:
+                # Select the format from the extracted info without downloading it
+                with yt_dlp.YoutubeDL(ydl_opts_stream) as ydl:
+                    return ydl.process_ie_result(dict(info), download=False)
+            except Exception as e:
+                logger.error(f"Failed to resolve audio stream: {str(e)}")
+                raise
 
         # Run in thread pool to avoid blocking
-        await asyncio.to_thread(download_audio)
\ No newline at end of file
+        selected = await asyncio.to_thread(select_format)
+
+        return selected['url'], selected.get('http_headers', {})
+
+    @staticmethod
+    def _estimate_filesize(info: dict) -> int | None:
+        """
+        Estimate the size of the best audio-only stream from the unprocessed info.
+        """
+        audio_formats = [
+            f for f in info.get('formats') or []
+            if f.get('vcodec') == 'none' and (f.get('filesize') or f.get('filesize_approx'))
+        ]
+        if not audio_formats:
+            return info.get('filesize') or info.get('filesize_approx')
+
+        best = max(audio_formats, key=lambda f: f.get('abr') or f.get('tbr') or 0)
+        return best.get('filesize') or best.get('filesize_approx')
+
+    @staticmethod
+    def _get_thumbnail_url(info: dict) -> str | None:
+        """
+        Pick the best thumbnail from the unprocessed info, as yt-dlp would.
+        """
+        if info.get('thumbnail'):
+            return info['thumbnail']
+
+        thumbnails = sorted(
+            info.get('thumbnails') or [],
+            key=lambda t: (
+                t.get('preference') if t.get('preference') is not None else -1,
+                t.get('width') or -1,
+                t.get('height') or -1,
+            )
+        )
+        return thumbnails[-1]['url'] if thumbnails else None
@@ -1,5 +1,7 @@
 import os
+from pathlib import Path
 
+from aiogram import Bot
 from aiogram.types import FSInputFile
 
 from config.settings import CHANNEL_ID
@@ -8,20 +10,39 @@ from core.utils import get_current_time
 from db.models import User
 from services.telethon import TelethonService
 
+# Largest files bots can send through api.telegram.org, and through a server in local mode
+BOT_API_UPLOAD_LIMIT = 50 * 1024 * 1024
+LOCAL_BOT_API_UPLOAD_LIMIT = 2000 * 1024 * 1024
+
+
+def get_upload_limit(bot: Bot) -> int:
+    return LOCAL_BOT_API_UPLOAD_LIMIT if bot.session.api.is_local else BOT_API_UPLOAD_LIMIT
+
+
+def get_input_file(bot: Bot, file_path: str) -> FSInputFile | str:
+    """
+    Get the file to send. A Bot API server in local mode reads it from disk by its file:// URI,
+    otherwise it is uploaded.
+    """
+    api = bot.session.api
+    if api.is_local:
+        return Path(api.wrap_local_file.to_server(os.path.abspath(file_path))).as_uri()
+    return FSInputFile(file_path)
+
 
 async def send_photo(bot, chat_id, photo_path, caption):
-    photo = FSInputFile(photo_path)
-    await bot.send_photo(chat_id=chat_id, photo=photo, caption=caption)
+    photo = get_input_file(bot, photo_path)
+    return await bot.send_photo(chat_id=chat_id, photo=photo, caption=caption)
 
 
 async def upload_to_telegram(bot, file_path, thumbnail_path, file_caption):
     if not os.path.isfile(file_path):
-        logger.error("The specified file does not exist.")
-        return
+        raise FileNotFoundError(f"The file to upload does not exist: {file_path}")
     try:
-        audio_file = FSInputFile(file_path)
+        audio_file = get_input_file(bot, file_path)
+        # Thumbnails can only be uploaded, even to a server in local mode
         thumbnail_file = FSInputFile(thumbnail_path)
-        await bot.send_audio(
+        return await bot.send_audio(
             chat_id=CHANNEL_ID,
             audio=audio_file,
             caption=f"🔉 <b>{file_caption}</b>",
@@ -29,10 +50,12 @@ async def upload_to_telegram(bot, file_path, thumbnail_path, file_caption):
         )
     except Exception as e:
         logger.error(f"An error occurred while uploading the file: {e}")
+        # The job fails instead of being recorded as done without its audio
+        raise
 
 
-async def upload_big_file(file_path: str, cover_image_path: str, data: dict[str, str]):
-    await TelethonService.upload_files(file_path, cover_image_path, data)
+async def upload_big_file(file_path: str, cover_image_path: str, data: dict[str, str]) -> int | None:
+    return await TelethonService.upload_files(file_path, cover_image_path, data)
 
 
 def is_new_user(user: User) -> bool:
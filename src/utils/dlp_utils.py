@@ -1,7 +1,22 @@
+import re
 import subprocess
 import time
 
 
+YOUTUBE_ID_PATTERN = re.compile(r"(?:[?&]v=|youtu\.be/|/shorts/|/embed/)([0-9A-Za-z_-]{11})")
+URL_PATTERN = re.compile(r"https://\S+")
+
+SUPPORTED_URL_PREFIXES = (
+    "https://www.youtube.com/watch?",
+    "https://youtu.be/",
+    "https://youtube.com/watch?",
+    "https://www.youtube.com/playlist?",
+    "https://youtube.com/playlist?",
+    "https://music.youtube.com/watch?",
+    "https://music.youtube.com/playlist?",
+)
+
+
 def valid_filename(filename: str) -> str:
 
     illegal_chars = ["\\", "/", ":", "*", "?", "\"", "<", ">", "|"]
@@ -13,3 +28,26 @@ def valid_filename(filename: str) -> str:
         else:
             valid += i
     return valid.strip(".")
+
+
+def get_video_id(url: str) -> str | None:
+    """
+    Extract the canonical YouTube video ID from the given URL.
+    """
+    match = YOUTUBE_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+
+def extract_urls(text: str) -> list[str]:
+    """
+    Extract all URLs from the message text, without duplicates.
+    """
+    return list(dict.fromkeys(URL_PATTERN.findall(text)))
+
+
+def is_supported_url(url: str) -> bool:
+    return url.startswith(SUPPORTED_URL_PREFIXES)
+
+
+def is_playlist_url(url: str) -> bool:
+    return "/playlist?" in url
@@ -0,0 +1,27 @@
+import io
+
+from PIL import Image, ImageOps
+
+# Telegram drops thumbnails bigger than 320px or 200 KB
+THUMBNAIL_SIZE = 320
+THUMBNAIL_MAX_BYTES = 200 * 1024
+
+
+def normalize_thumbnail(source_path: str, save_path: str, size: int = THUMBNAIL_SIZE, max_bytes: int = THUMBNAIL_MAX_BYTES) -> None:
+    """
+    Square-crop and downscale the image, and save it as a JPEG that fits in `max_bytes`.
+    """
+    with Image.open(source_path) as image:
+        image = ImageOps.fit(image.convert('RGB'), (size, size), method=Image.Resampling.LANCZOS)
+
+    # Lower the quality until the image fits
+    content = b''
+    for quality in range(90, 30, -10):
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=quality, optimize=True)
+        content = buffer.getvalue()
+        if len(content) <= max_bytes:
+            break
+
+    with open(save_path, 'wb') as f:
+        f.write(content)